@@ -1,30 +1,8 @@
 import streamlit as st
-import psycopg2
-import os
-from dotenv import load_dotenv
 import random
 
-# Load environment variables
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT_NO")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
+# Share the connection pool with the main dashboard, run from the project root
+from tabs.db import get_db_connection
 
 
 def initialise_db():
@@ -1,13 +1,11 @@
 from h2ogpte import H2OGPTE
 import os
-import psycopg2
-from dotenv import load_dotenv
-import pandas as pd
 import json
 
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
+# Loads the project's .env and shares the connection pool with the dashboard
+from tabs.db import get_db_connection, read_sql
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
 
 client = H2OGPTE(
     address="https://h2ogpte.genai.h2o.ai", api_key=os.getenv("H2O_API_KEY")
@@ -15,30 +13,12 @@ client = H2OGPTE(
 
 llm = "gpt-4-1106-preview"
 
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT_NO")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
-
 
 def load_data():
     """Load and preprocess actual and forecast data."""
-    with get_db_connection() as conn:
-        products = pd.read_sql_query(
-            "SELECT product_id, product_name, category FROM products LIMIT 10", conn
-        )
+    products = read_sql(
+        "SELECT product_id, product_name, category FROM products LIMIT 10"
+    )
     return products
 
 
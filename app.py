@@ -1,24 +1,33 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, status
-import pandas as pd
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, status
 from io import StringIO
-from tabs.bonus_computer_vision import (
-    predict_product_category,
-    load_product_categorisation_model,
-    search_similar_products,
-)
-from tabs.bonus_sentiment_analysis import get_vader_score, load_vader
-from tabs.bonus_personalized_email import generate_personalized_email_h2o
-from tabs.bonus_ai_chatbot import get_recommendation
-from demand_forecast.demand_forecasting import load_model_and_predict
+
+# Feature modules pull in TensorFlow, nltk, h2ogpte and LightGBM, so each endpoint
+# imports what it needs on first use to keep the service start-up fast.
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the customer index in a background thread, start-up does not wait for it
+    from purchase_behaviour.customer_index import start_refresher
+
+    start_refresher()
+    yield
+
 
 app = FastAPI(
-    title="Passion8", description="Ecommerce Analysis and Optimization", version="0.1.0"
+    title="Passion8",
+    description="Ecommerce Analysis and Optimization",
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 
 @app.post("/bonus/analyse_sentiment", tags=["Bonus"])
 async def analyse_sentiment(review: str):
     try:
+        from tabs.bonus_sentiment_analysis import get_vader_score, load_vader
+
         model = load_vader()
         score = get_vader_score(review, model)
         if score >= 0.5:
@@ -36,6 +45,11 @@ async def analyse_sentiment(review: str):
 @app.post("/bonus/classify_product", tags=["Bonus"])
 async def classify_product_image(file: UploadFile):
     try:
+        from tabs.bonus_computer_vision import (
+            predict_product_category,
+            load_product_categorisation_model,
+        )
+
         model = load_product_categorisation_model()
         product_category = predict_product_category(model, file.file.read())
         return {"product_category": product_category}
@@ -48,6 +62,8 @@ async def classify_product_image(file: UploadFile):
 @app.post("/bonus/search_similar_products", tags=["Bonus"])
 async def search_similar_products_endpoint(file: UploadFile, number_of_products: int):
     try:
+        from tabs.bonus_computer_vision import search_similar_products
+
         similar_products = search_similar_products(file.file.read(), number_of_products)
         similar_products_link = [i[0] for i in similar_products]
         return {"similar_products": similar_products_link}
@@ -60,6 +76,8 @@ async def search_similar_products_endpoint(file: UploadFile, number_of_products:
 @app.post("/bonus/generate_personalized_email", tags=["Bonus"])
 async def generate_personalized_email(user_id: int):
     try:
+        from tabs.bonus_personalized_email import generate_personalized_email_h2o
+
         email_content = generate_personalized_email_h2o(user_id)
         return {"email_content": email_content}
     except Exception as e:
@@ -71,6 +89,8 @@ async def generate_personalized_email(user_id: int):
 @app.post("/bonus/get_product_recommendation", tags=["Bonus"])
 async def get_product_recommendation(user_query: str):
     try:
+        from tabs.bonus_ai_chatbot import get_recommendation
+
         chat_session_id = None
         recommendation = get_recommendation(chat_session_id, user_query)
         return {"recommendation": recommendation}
@@ -80,11 +100,59 @@ async def get_product_recommendation(user_query: str):
         )
 
 
+@app.get("/customers/top_value", tags=["Customer Analysis"])
+def get_top_customers(n: int = Query(10, ge=1, le=1000), segment: str = None):
+    """Customers with the highest CLTV, as precomputed by the batch scoring job."""
+    # A plain def, the query runs in the thread pool instead of on the event loop
+    try:
+        from tabs.db import read_sql
+
+        query = "SELECT * FROM customer_scores WHERE clv IS NOT NULL"
+        params = {"n": n}
+        if segment is not None:
+            query += " AND clv_segment = %(segment)s"
+            params["segment"] = segment
+        query += " ORDER BY clv DESC LIMIT %(n)s"
+        scores = read_sql(query, params=params)
+        scores["scored_at"] = scores["scored_at"].astype(str)
+        # JSON has no NaN, customers without a model or interval get nulls
+        scores = scores.astype(object).where(scores.notna(), None)
+        return {"customers": scores.to_dict(orient="records")}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+
+
+@app.get("/customers/{cust_id}/value", tags=["Customer Analysis"])
+def get_customer_value(cust_id: int, weeks: int = Query(12, ge=1, le=520)):
+    """RFM score and segment, expected purchases in the next weeks and predicted CLTV."""
+    # A plain def runs in the thread pool, so waiting for the first index build
+    # never blocks the event loop
+    try:
+        from purchase_behaviour.customer_index import get_customer_index
+
+        value = get_customer_index().lookup(cust_id, weeks)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e)
+        )
+    if value is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Customer {cust_id} not found",
+        )
+    return value
+
+
 @app.post("/grpb/demand_forecast", tags=["Demand Forecast"])
 async def predict_sales(
     test_data: UploadFile = File(...), trained_model_file: UploadFile = File(...)
 ):
     try:
+        import pandas as pd
+        from demand_forecast.demand_forecasting import load_model_and_predict
+
         # Load test data
         test_df = pd.read_csv(StringIO((await test_data.read()).decode("utf-8")))
 
@@ -0,0 +1,93 @@
+"""Time the bitmap churn engine against the previous per quarter set differences.
+
+Random purchases of the given number of customers are spread over five years
+and churn is computed per quarter, month and week, followed by the monthly
+cohort retention and revenue matrices. The previous version, which
+diffs Python sets of user ids quarter by quarter, is only timed up to
+--max-sets rows.
+
+Usage:
+    python benchmarks/churn_engine.py [--customers 100000 1000000] [--rows-per-customer 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tabs.churn_engine import PERIODS, churn_metrics, cohort_matrices
+
+
+def random_purchases(customers, rows_per_customer, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = customers * rows_per_customer
+    start = pd.Timestamp("2015-01-01").value
+    span = (pd.Timestamp("2019-12-31") - pd.Timestamp("2015-01-01")).value
+    return pd.DataFrame(
+        {
+            "user_id": rng.integers(customers, size=rows),
+            "date": pd.to_datetime(start + (span * rng.random(rows)).astype(np.int64)),
+            "total_spent": rng.gamma(2, 50, size=rows),
+        }
+    )
+
+
+def previous_churn_rate(df):
+    """Quarterly churn as computed before, one set difference per quarter."""
+    df = df.assign(year_quarter=df["date"].dt.to_period("Q"))
+    customers_per_quarter = df.groupby("year_quarter")["user_id"].unique().reset_index()
+    churn_rates = []
+    for i in range(1, len(customers_per_quarter)):
+        current_customers = set(customers_per_quarter["user_id"].iloc[i])
+        previous_customers = set(customers_per_quarter["user_id"].iloc[i - 1])
+        churned_customers = previous_customers - current_customers
+        churn_rates.append(len(churned_customers) / len(previous_customers))
+    return churn_rates
+
+
+def run(customers=(100_000, 1_000_000), rows_per_customer=10, max_sets=2_000_000):
+    for size in customers:
+        df = random_purchases(size, rows_per_customer)
+        timings = {}
+        if len(df) <= max_sets:
+            start = time.perf_counter()
+            expected = previous_churn_rate(df)
+            timings["sets (Q)"] = time.perf_counter() - start
+        for name, freq in PERIODS.items():
+            start = time.perf_counter()
+            metrics = churn_metrics(df["user_id"], df["date"], freq)
+            timings[f"bitmaps ({freq}, {len(metrics) + 1} periods)"] = (
+                time.perf_counter() - start
+            )
+            if freq == "Q" and "sets (Q)" in timings:
+                assert np.allclose(metrics["churn_rate"], expected)
+        start = time.perf_counter()
+        retention, _, _ = cohort_matrices(
+            df["user_id"], df["date"], df["total_spent"], "M"
+        )
+        timings[f"cohorts (M, {retention.shape[0]}x{retention.shape[1]})"] = (
+            time.perf_counter() - start
+        )
+        print(
+            f"{size} customers, {len(df)} rows: "
+            + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--customers", type=int, nargs="+", default=[100_000, 1_000_000]
+    )
+    parser.add_argument("--rows-per-customer", type=int, default=10)
+    parser.add_argument("--max-sets", type=int, default=2_000_000)
+    args = parser.parse_args()
+    run(
+        customers=args.customers,
+        rows_per_customer=args.rows_per_customer,
+        max_sets=args.max_sets,
+    )
@@ -0,0 +1,82 @@
+"""Measure the latency of the per customer CLTV lookup behind /customers/{cust_id}/value.
+
+By default the in-memory index is built once and random customers are looked up
+in process. With --url the endpoint of a running API is called instead, from a
+pool of threads, e.g. after `uvicorn app:app --workers 1`.
+
+Usage:
+    python benchmarks/customer_lookup.py [--requests 20000] [--weeks 12]
+    python benchmarks/customer_lookup.py --url http://localhost:8000 [--threads 16]
+"""
+
+import argparse
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchase_behaviour.customer_index import get_customer_index
+
+# p99 latency the endpoint has to stay under, in milliseconds
+P99_BUDGET_MS = 5.0
+
+
+def report(latencies, elapsed):
+    latencies = np.asarray(latencies) * 1000
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(
+        f"{len(latencies)} lookups: p50 {p50:.3f} ms, p99 {p99:.3f} ms, "
+        f"max {latencies.max():.3f} ms, {len(latencies) / elapsed:.0f} requests/s"
+    )
+    return p99
+
+
+def run_in_process(cust_ids, weeks):
+    index = get_customer_index()
+    index.lookup(int(cust_ids[0]), weeks)
+    latencies = []
+    start = time.perf_counter()
+    for cust_id in cust_ids:
+        t = time.perf_counter()
+        get_customer_index().lookup(int(cust_id), weeks)
+        latencies.append(time.perf_counter() - t)
+    return report(latencies, time.perf_counter() - start)
+
+
+def run_http(url, cust_ids, weeks, threads):
+    def call(cust_id):
+        t = time.perf_counter()
+        try:
+            urllib.request.urlopen(
+                f"{url}/customers/{cust_id}/value?weeks={weeks}"
+            ).read()
+        except urllib.error.HTTPError:
+            pass
+        return time.perf_counter() - t
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(call, cust_ids))
+    return report(latencies, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--url", help="Base URL of a running API.")
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3101)
+    cust_ids = rng.choice(get_customer_index().cust_ids, size=args.requests)
+    if args.url:
+        p99 = run_http(args.url.rstrip("/"), cust_ids, args.weeks, args.threads)
+    else:
+        p99 = run_in_process(cust_ids, args.weeks)
+    sys.exit(0 if p99 <= P99_BUDGET_MS else 1)
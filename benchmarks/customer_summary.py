@@ -0,0 +1,94 @@
+"""Time the customer summary kernel against the per chart groupbys it replaced.
+
+The enriched sales are replicated 1x, 10x and 100x with fresh customer and
+transaction ids. The previous code ran a groupby with a Python lambda for RFM
+recency plus separate groupbys for the historical CLTV chart and the BG/NBD
+summary; customer_totals computes everything those need in one pass.
+
+Usage:
+    python benchmarks/customer_summary.py [--scales 1 10 100]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchase_behaviour.batch_scoring import load_sales
+from purchase_behaviour.customer_features import customer_totals
+
+REFERENCE_DATE = pd.Timestamp("2020-01-01")
+
+
+def scale_sales(sales, factor):
+    """Stack factor copies of the sales, each with its own customers and orders."""
+    copies = []
+    cust_offset = int(sales["cust_id"].max()) + 1
+    transaction_offset = int(sales["transaction_id"].max()) + 1
+    for i in range(factor):
+        copy = sales.copy()
+        copy["cust_id"] = copy["cust_id"].astype(np.int64) + i * cust_offset
+        copy["transaction_id"] = (
+            copy["transaction_id"].astype(np.int64) + i * transaction_offset
+        )
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def previous_groupbys(sales):
+    """The RFM, historical CLTV and BG/NBD aggregations as they were before."""
+    sales.groupby("cust_id").agg(
+        {
+            "date": lambda x: (REFERENCE_DATE - x.max()).days,
+            "transaction_id": "count",
+            "total_price": "sum",
+        }
+    )
+    sales.groupby("cust_id").agg(
+        {
+            "transaction_id": "nunique",
+            "total_price": "sum",
+            "product_id": "nunique",
+            "date": "max",
+        }
+    )
+    sales.groupby("cust_id").agg(
+        {
+            "date": [min, max],
+            "transaction_id": "nunique",
+            "total_price": "sum",
+        }
+    )
+
+
+def best_of(func, sales, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(sales)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(scales=(1, 10, 100), repeat=3):
+    sales = load_sales()
+    print(f"{'scale':>6}{'rows':>12}{'before (s)':>13}{'after (s)':>12}{'speedup':>10}")
+    for factor in scales:
+        scaled = scale_sales(sales, factor)
+        before = best_of(previous_groupbys, scaled, 1 if factor >= 100 else repeat)
+        after = best_of(customer_totals, scaled, repeat)
+        print(
+            f"{factor:>5}x{len(scaled):>12}{before:>13.3f}{after:>12.3f}"
+            f"{before / after:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+    run(scales=args.scales)
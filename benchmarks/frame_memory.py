@@ -0,0 +1,50 @@
+"""Report the memory of every dashboard frame before and after the schema registry.
+
+Each table registered in tabs/schema.py is read straight from Postgres (and the
+marketing channels CSV from disk), converted with apply_schema and measured with
+DataFrame.memory_usage(deep=True).
+
+Usage:
+    python benchmarks/frame_memory.py
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tabs.db import read_sql
+from tabs.schema import apply_schema, memory_report
+
+TABLES = [
+    "online_sales",
+    "products",
+    "users",
+    "ratings",
+    "shipping_status",
+    "shipping_history",
+    "sales_enriched",
+]
+MARKETING_CHANNELS_CSV = "marketing_channels/marketing_channels.csv"
+
+
+def run():
+    for table in TABLES:
+        apply_schema(read_sql(f"SELECT * FROM {table}"), table)
+    if os.path.exists(MARKETING_CHANNELS_CSV):
+        apply_schema(pd.read_csv(MARKETING_CHANNELS_CSV), "marketing_channels")
+
+    report = memory_report()
+    print(report.to_string(float_format=lambda x: f"{x:.2f}"))
+    total_before = report["before_mb"].sum()
+    total_after = report["after_mb"].sum()
+    print(
+        f"\nTotal: {total_before:.2f} MB -> {total_after:.2f} MB "
+        f"({total_before / total_after:.1f}x smaller)"
+    )
+    return report
+
+
+if __name__ == "__main__":
+    run()
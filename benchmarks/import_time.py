@@ -0,0 +1,73 @@
+"""Check the cold import time of the API and the Bonus page modules against a budget.
+
+Each module is imported in a fresh interpreter with ``python -X importtime`` and
+the cumulative time of the module itself is compared with its budget. Heavy
+libraries (TensorFlow, nltk, h2ogpte, LightGBM, sklearn) and data loads must be
+deferred to the endpoint or tab that uses them, so these imports stay cheap.
+
+Usage:
+    python benchmarks/import_time.py [--budget SECONDS]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed per module, in seconds
+BUDGETS = {
+    "app": 2.0,
+    "tabs.bonus_ai_chatbot": 2.0,
+    "tabs.bonus_computer_vision": 2.0,
+    "tabs.bonus_sentiment_analysis": 2.0,
+    "tabs.bonus_personalized_email": 2.0,
+}
+
+
+def import_time(module):
+    """Return the cumulative import time of a module in seconds, in a cold interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()[-1]
+        raise RuntimeError(f"import {module} failed: {error}")
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    pattern = re.compile(
+        rf"import time:\s*\d+\s*\|\s*(\d+)\s*\|\s*{re.escape(module)}$"
+    )
+    for line in result.stderr.splitlines():
+        match = pattern.match(line.strip())
+        if match:
+            return int(match.group(1)) / 1e6
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def run(budget=None):
+    over_budget = []
+    print(f"{'module':<34}{'import (s)':>12}{'budget (s)':>12}")
+    for module, module_budget in BUDGETS.items():
+        limit = budget if budget is not None else module_budget
+        seconds = import_time(module)
+        flag = "" if seconds <= limit else "  OVER"
+        print(f"{module:<34}{seconds:>12.2f}{limit:>12.2f}{flag}")
+        if seconds > limit:
+            over_budget.append(module)
+    return over_budget
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--budget",
+        type=float,
+        help="Use the same budget in seconds for every module.",
+    )
+    args = parser.parse_args()
+    sys.exit(1 if run(budget=args.budget) else 0)
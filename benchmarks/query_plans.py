@@ -0,0 +1,136 @@
+"""Compare query plans of the app's queries with and without the schema indexes.
+
+Every query is explained twice with EXPLAIN (ANALYZE, BUFFERS): once against the
+schema from data/init.sql, and once inside a transaction that drops the secondary
+indexes and disables partition pruning, which is rolled back afterwards. The
+dropped indexes are locked for the duration of the run, so do not point this at
+a database that is serving users.
+
+Usage:
+    python benchmarks/query_plans.py [--plans]
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tabs.db import get_db_connection
+
+INDEXES = [
+    "online_sales_product_id_date",
+    "online_sales_cust_id_date",
+    "shipping_history_shipping_id_update_date",
+]
+
+QUERIES = {
+    # tabs/tab1b.py load_data
+    "actual_sales": """
+        SELECT date, product_id, SUM(quantity) AS sales
+        FROM online_sales
+        GROUP BY date, product_id
+        ORDER BY product_id, date
+    """,
+    # tabs/tab1b.py filter_data_by_product, pushed down to the database
+    "product_sales": """
+        SELECT date, SUM(quantity) AS sales
+        FROM online_sales
+        WHERE product_id = %(product_id)s
+        GROUP BY date
+        ORDER BY date
+    """,
+    # Per customer history used by the customer analysis models
+    "customer_history": """
+        SELECT date, transaction_id, product_id, quantity
+        FROM online_sales
+        WHERE cust_id = %(cust_id)s AND date >= %(since)s
+        ORDER BY date
+    """,
+    # Daily totals of one quarter, as grouped by the churn and revenue charts
+    "quarter_daily_sales": """
+        SELECT date, COUNT(DISTINCT transaction_id) AS transactions, SUM(quantity) AS quantity
+        FROM online_sales
+        WHERE date >= %(since)s AND date < %(since)s::DATE + INTERVAL '3 months'
+        GROUP BY date
+    """,
+    # tabs/tab3b.py load_data_tab3
+    "shipping_history_status": """
+        SELECT s.product_id, s.shipping_id, s.fulfilment, s.ship_service_level,
+               s.estimated_delivery_date, s.fulfilled_by, h.status, h.update_date
+        FROM shipping_status AS s
+        RIGHT JOIN shipping_history AS h ON s.shipping_id = h.shipping_id
+    """,
+    # tabs/tab3b.py preprocess_data for a single order
+    "shipping_timeline": """
+        SELECT status, update_date
+        FROM shipping_history
+        WHERE shipping_id = %(shipping_id)s
+        ORDER BY update_date
+    """,
+}
+
+
+def sample_parameters(cur):
+    """Pick a real product, customer, quarter and shipment to run the queries with."""
+    cur.execute(
+        "SELECT product_id, cust_id, date_trunc('quarter', date)::DATE "
+        "FROM online_sales ORDER BY date DESC LIMIT 1"
+    )
+    product_id, cust_id, since = cur.fetchone() or (None, None, None)
+    cur.execute("SELECT shipping_id FROM shipping_history LIMIT 1")
+    row = cur.fetchone()
+    return {
+        "product_id": product_id,
+        "cust_id": cust_id,
+        "since": since,
+        "shipping_id": row[0] if row else None,
+    }
+
+
+def explain(cur, query, params):
+    """Return the EXPLAIN ANALYZE plan and its execution time in milliseconds."""
+    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+    plan = "\n".join(row[0] for row in cur.fetchall())
+    match = re.search(r"Execution Time: ([\d.]+) ms", plan)
+    return plan, float(match.group(1)) if match else float("nan")
+
+
+def run(show_plans=False):
+    results = {}
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            params = sample_parameters(cur)
+
+            for name, query in QUERIES.items():
+                results[name] = {"after": explain(cur, query, params)}
+
+            # Baseline without the secondary indexes and partition pruning
+            for index in INDEXES:
+                cur.execute(f"DROP INDEX IF EXISTS {index}")
+            cur.execute("SET LOCAL enable_partition_pruning = off")
+            for name, query in QUERIES.items():
+                results[name]["before"] = explain(cur, query, params)
+        conn.rollback()
+
+    print(f"{'query':<26}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for name, plans in results.items():
+        before, after = plans["before"][1], plans["after"][1]
+        speedup = before / after if after else float("nan")
+        print(f"{name:<26}{before:>14.2f}{after:>14.2f}{speedup:>9.1f}x")
+
+    if show_plans:
+        for name, plans in results.items():
+            for label in ("before", "after"):
+                print(f"\n=== {name} ({label}) ===")
+                print(plans[label][0])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--plans", action="store_true", help="Print the full before/after plans."
+    )
+    args = parser.parse_args()
+    run(show_plans=args.plans)
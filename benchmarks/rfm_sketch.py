@@ -0,0 +1,102 @@
+"""Compare streaming RFM ranks from quantile sketches with the exact pd.qcut ranks.
+
+Customers are resampled from the real customer totals, with fresh ids, up to
+each population size. For every RFM column the report shows the guaranteed
+rank error bound of the merged sketch, the measured rank error of its quintile
+edges and the share of customers whose 1-5 rank differs from pd.qcut. Frequency
+ties are broken by customer instead of by row order, so part of its rank
+differences are ties landing on the other side of an edge.
+
+Usage:
+    python benchmarks/rfm_sketch.py [--customers 1000000 10000000] [--chunksize 1000000] [--k 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchase_behaviour.batch_scoring import load_sales
+from purchase_behaviour.customer_features import (
+    customer_totals,
+    rfm_table,
+    rfm_values,
+    streaming_rfm_table,
+)
+from purchase_behaviour.quantile_sketch import (
+    RFM_COLUMNS,
+    RFM_QUANTILES,
+    merge_rfm_sketches,
+    rfm_sketch_values,
+    sketch_rfm,
+)
+
+
+def resample_totals(totals, customers, seed=0):
+    """Draw customers with replacement from the real totals, each with its own id."""
+    rng = np.random.default_rng(seed)
+    sample = totals.iloc[rng.integers(len(totals), size=customers)]
+    return sample.set_axis(pd.RangeIndex(customers, name="cust_id"))
+
+
+def edge_errors(rfm, sketches):
+    """Largest distance between the exact rank of each sketch edge and its quantile."""
+    errors = {}
+    for column, values in rfm_sketch_values(rfm).items():
+        values = np.sort(np.asarray(values, dtype=float))
+        edges = sketches[column].quantiles(RFM_QUANTILES)
+        below = np.searchsorted(values, edges, side="left") / len(values)
+        at_or_below = np.searchsorted(values, edges, side="right") / len(values)
+        # Zero when the quantile falls inside a run of tied values at the edge
+        q = np.asarray(RFM_QUANTILES)
+        errors[column] = float(
+            np.max(np.maximum(0, np.maximum(below - q, q - at_or_below)))
+        )
+    return errors
+
+
+def run(customers=(1_000_000, 10_000_000), chunksize=1_000_000, k=200):
+    totals = customer_totals(load_sales())
+    for size in customers:
+        sample = resample_totals(totals, size)
+        chunks = [sample.iloc[i : i + chunksize] for i in range(0, size, chunksize)]
+
+        start = time.perf_counter()
+        exact = rfm_table(sample, quantiles="exact")
+        exact_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = pd.concat(streaming_rfm_table(lambda: chunks, k=k))
+        sketch_time = time.perf_counter() - start
+
+        sketches = merge_rfm_sketches(sketch_rfm(rfm_values(c), k) for c in chunks)
+        errors = edge_errors(rfm_values(sample), sketches)
+        print(
+            f"{size} customers in {len(chunks)} chunks: qcut {exact_time:.2f}s, "
+            f"sketch {sketch_time:.2f}s"
+        )
+        print(f"{'column':>12}{'bound':>10}{'edge error':>12}{'rank differs':>14}")
+        for column in RFM_COLUMNS:
+            rank = f"{column}_rank"
+            differs = (exact[rank].astype(int) != approx[rank]).mean()
+            print(
+                f"{column:>12}{sketches[column].error_bound():>10.4f}"
+                f"{errors[column]:>12.4f}{differs:>14.4f}"
+            )
+        segment_differs = (exact["Segment"] != approx["Segment"]).mean()
+        print(f"{'Segment':>12}{'':>10}{'':>12}{segment_differs:>14.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--customers", type=int, nargs="+", default=[1_000_000, 10_000_000]
+    )
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    parser.add_argument("--k", type=int, default=200)
+    args = parser.parse_args()
+    run(customers=args.customers, chunksize=args.chunksize, k=args.k)
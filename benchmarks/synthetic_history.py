@@ -0,0 +1,148 @@
+"""Time the synthetic 2018 baseline of the churn tab and write load-test data.
+
+Compares the vectorised generator in tabs/synthetic_sales.py with the previous
+row-wise apply version on the 2019 sales, prints a few distribution statistics
+of both so they can be checked side by side, then generates the history at each
+scale factor. With --output the largest scale is written to a CSV file chunk by
+chunk, for use as load-test data.
+
+Usage:
+    python benchmarks/synthetic_history.py [--scales 1 10 100] [--output synthetic_sales.csv]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tabs.snapshot import load_table
+from tabs.synthetic_sales import synthetic_history, total_spent
+
+
+def load_reference():
+    """The 2019 sales with product details and quarter, as the churn tab builds them."""
+    products = load_table("products")[
+        ["product_id", "product_name", "category", "actual_price"]
+    ]
+    sales = load_table("online_sales").drop(columns=["delivery_charges"])
+    df_2019 = pd.merge(sales, products, on="product_id", how="left")
+    df_2019 = df_2019.rename(columns={"cust_id": "user_id"})
+    df_2019["quarter"] = df_2019["date"].dt.quarter
+    return df_2019, products
+
+
+def previous_history(df_2019, products_df):
+    """The 2018 baseline as it was generated before, one random choice per row."""
+    np.random.seed(3101)
+    n_transactions = len(df_2019)
+    start_date = pd.to_datetime("2018-01-01")
+    end_date = pd.to_datetime("2018-12-31")
+    df_2018 = pd.DataFrame(
+        {
+            "transaction_id": np.arange(1, n_transactions + 1),
+            "date": start_date
+            + (end_date - start_date) * np.random.rand(n_transactions),
+            "product_id": np.random.choice(
+                df_2019["product_id"].unique(), size=n_transactions
+            ),
+            "quantity": np.random.randint(
+                1, np.percentile(df_2019["quantity"], 90) + 1, size=n_transactions
+            ),
+        }
+    )
+    df_2018 = pd.merge(df_2018, products_df, on="product_id", how="left")
+    df_2018["quarter"] = df_2018["date"].dt.quarter
+    df_2018["coupon_status"] = np.nan
+    df_2018["discount_percentage"] = 0
+    unique_users_per_quarter_2019 = (
+        df_2019.groupby("quarter")["user_id"].unique().to_dict()
+    )
+
+    def assign_user_ids(row):
+        unique_users = unique_users_per_quarter_2019.get(row["quarter"], [])
+        return np.random.choice(unique_users, size=1)[0]
+
+    df_2018["user_id"] = df_2018.apply(assign_user_ids, axis=1)
+    df_2018 = df_2018.sample(frac=0.8, random_state=42).reset_index(drop=True)
+    df_2018["total_spent"] = df_2018.apply(
+        lambda row: (
+            row["actual_price"] * row["quantity"] * (1 - row["discount_percentage"])
+            if row["coupon_status"] == "Used"
+            else row["actual_price"] * row["quantity"]
+        ),
+        axis=1,
+    )
+    return df_2018
+
+
+def vectorised_history(df_2019, products, scale=1, chunksize=1_000_000):
+    df_2018 = pd.concat(
+        synthetic_history(df_2019, products, scale=scale, chunksize=chunksize),
+        ignore_index=True,
+    )
+    df_2018["total_spent"] = total_spent(df_2018)
+    return df_2018
+
+
+def statistics(df):
+    users = df.groupby("quarter")["user_id"].nunique()
+    return {
+        "rows": len(df),
+        "mean quantity": df["quantity"].mean(),
+        "mean total_spent": df["total_spent"].mean(),
+        "share per quarter": " ".join(
+            f"{share:.3f}"
+            for share in df["quarter"].value_counts(normalize=True).sort_index()
+        ),
+        "users per quarter": " ".join(str(count) for count in users),
+        "products": df["product_id"].nunique(),
+    }
+
+
+def run(scales=(1, 10, 100), output=None):
+    df_2019, products = load_reference()
+
+    start = time.perf_counter()
+    before = previous_history(df_2019, products)
+    before_time = time.perf_counter() - start
+    start = time.perf_counter()
+    after = vectorised_history(df_2019, products)
+    after_time = time.perf_counter() - start
+    print(
+        f"1x: apply {before_time:.2f}s, vectorised {after_time:.3f}s "
+        f"({before_time / after_time:.0f}x faster)"
+    )
+    comparison = pd.DataFrame(
+        {"apply": statistics(before), "vectorised": statistics(after)}
+    )
+    print(comparison.to_string())
+
+    for scale in scales:
+        start = time.perf_counter()
+        rows = sum(
+            len(chunk) for chunk in synthetic_history(df_2019, products, scale=scale)
+        )
+        print(f"{scale:>5}x: {rows} rows in {time.perf_counter() - start:.2f}s")
+
+    if output:
+        start = time.perf_counter()
+        for i, chunk in enumerate(
+            synthetic_history(df_2019, products, scale=max(scales))
+        ):
+            chunk["total_spent"] = total_spent(chunk)
+            chunk.to_csv(
+                output, mode="w" if i == 0 else "a", header=i == 0, index=False
+            )
+        print(f"Wrote {output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--output", help="CSV file for the largest scale.")
+    args = parser.parse_args()
+    run(scales=args.scales, output=args.output)
@@ -1,9 +1,83 @@
 import os
+import io
+import time
+import argparse
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import create_engine, inspect
 import logging
 
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CSV_PATHS = {
+    "products": "data/products.csv",
+    "ratings": "data/ratings.csv",
+    "users": ["data/users.csv", "data/online_sales_users.csv"],
+    "user_behaviour": "data/user_behaviour.csv",
+    "online_sales": "data/online_sales_edited.csv",
+    "shipping_status": "data/shipping_status.csv",
+    "shipping_history": "data/shipping_history.csv",
+}
+
+DATE_COLUMNS = {
+    "online_sales": ["date"],
+    "shipping_history": ["date", "update_date"],
+    "shipping_status": ["date", "estimated_delivery_date"],
+}
+
+VIEWS_SQL = "data/views.sql"
+
+# Materialised views built on top of the loaded tables, see data/views.sql
+MATERIALIZED_VIEWS = ["sales_enriched"]
+
+# Column tracking how far each fact table has been ingested
+WATERMARK_COLUMNS = {
+    "online_sales": "date",
+    "shipping_status": "date",
+    "shipping_history": "update_date",
+}
+
+# Natural keys not enforced by a unique constraint in data/init.sql, deduplicated
+# on these columns while merging. The primary keys of the partitioned tables have
+# to include their partition column, so a sale or status delivered again with
+# another date would pass ON CONFLICT.
+NATURAL_KEYS = {
+    "ratings": ["product_id"],
+    "online_sales": [
+        "cust_id",
+        "transaction_id",
+        "product_id",
+        "coupon_status",
+        "coupon_code",
+    ],
+    "shipping_history": ["shipping_id", "status"],
+}
+
+# Per customer totals kept up to date from the newly ingested online_sales rows
+SUMMARY_SOURCE = "online_sales"
+
+# Same rows and total_price as the sales_enriched view in data/views.sql
+ENRICHED_SALES_SQL = """
+    SELECT s.cust_id, s.transaction_id, s.date, s.product_id,
+        (CASE
+            WHEN s.coupon_status = 'Used'
+                THEN s.quantity * p.actual_price * (1 - s.discount_percentage)
+            ELSE s.quantity * p.actual_price
+        END)::DOUBLE PRECISION AS total_price
+    FROM {source} AS s
+    JOIN products AS p ON p.product_id = s.product_id
+    JOIN users AS u ON u.user_id = s.cust_id
+    WHERE EXISTS (SELECT 1 FROM ratings AS r WHERE r.product_id = s.product_id)
+    {condition}
+"""
+
+# Foreign key levels from data/init.sql, tables within a level are independent
+LOAD_ORDER = [
+    ["products", "users"],
+    ["ratings", "user_behaviour", "online_sales", "shipping_status"],
+    ["shipping_history"],
+]
 
 
 # Read environment variables
@@ -34,17 +108,8 @@ def connect_to_db(engine):
 
 
 def read_csv_files():
-    paths = {
-        "products": "data/products.csv",
-        "ratings": "data/ratings.csv",
-        "users": ["data/users.csv", "data/online_sales_users.csv"],
-        "user_behaviour": "data/user_behaviour.csv",
-        "online_sales": "data/online_sales_edited.csv",
-        "shipping_status": "data/shipping_status.csv",
-        "shipping_history": "data/shipping_history.csv",
-    }
     dataframes = {}
-    for name, path in paths.items():
+    for name, path in CSV_PATHS.items():
         if isinstance(path, list):
             # Concatenate multiple CSV files into one DataFrame
             df_list = [pd.read_csv(p) for p in path]
@@ -55,12 +120,7 @@ def read_csv_files():
 
 
 def convert_date_columns(dataframes):
-    date_columns = {
-        "online_sales": ["date"],
-        "shipping_history": ["date", "update_date"],
-        "shipping_status": ["date", "estimated_delivery_date"],
-    }
-    for df_name, columns in date_columns.items():
+    for df_name, columns in DATE_COLUMNS.items():
         for column in columns:
             dataframes[df_name][column] = pd.to_datetime(
                 dataframes[df_name][column], format="%Y-%m-%d", errors="raise"
@@ -73,14 +133,476 @@ def insert_data_to_db(dataframes, engine):
         df.to_sql(table_name, engine, if_exists="append", index=False)
 
 
+def iter_csv_chunks(table_name, chunksize):
+    # Stream the CSV files of a table without loading them fully into memory
+    paths = CSV_PATHS[table_name]
+    if not isinstance(paths, list):
+        paths = [paths]
+    for path in paths:
+        # Keep values as text, Postgres parses them itself during COPY
+        for chunk in pd.read_csv(
+            path, chunksize=chunksize, dtype=str, keep_default_na=False
+        ):
+            for column in DATE_COLUMNS.get(table_name, []):
+                # Validate the dates before they reach the database
+                pd.to_datetime(chunk[column], format="%Y-%m-%d", errors="raise")
+            yield chunk
+
+
+def copy_chunks(cursor, table_name, chunks):
+    # Send each chunk through COPY FROM STDIN and return the number of rows copied
+    rows = 0
+    for chunk in chunks:
+        buffer = io.StringIO()
+        chunk.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        columns = ", ".join(chunk.columns)
+        cursor.copy_expert(
+            f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        rows += len(chunk)
+    return rows
+
+
+def copy_table(engine, table_name, chunksize):
+    # Bulk load one table on its own connection and report its throughput
+    start = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            rows = copy_chunks(
+                cursor, table_name, iter_csv_chunks(table_name, chunksize)
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%s: %d rows in %.2fs (%.0f rows/sec)",
+        table_name,
+        rows,
+        elapsed,
+        rows / elapsed if elapsed else 0,
+    )
+    return rows, elapsed
+
+
+def bulk_load_to_db(engine, chunksize=50_000, workers=4):
+    # Load each foreign key level in parallel, waiting for a level before the next
+    stats = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for level in LOAD_ORDER:
+            futures = {
+                table_name: executor.submit(copy_table, engine, table_name, chunksize)
+                for table_name in level
+            }
+            for table_name, future in futures.items():
+                stats[table_name] = future.result()
+    return stats
+
+
+def create_watermark_table(engine):
+    # Keep one watermark per table so reruns only pick up new rows
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingestion_watermarks (
+                    table_name VARCHAR(50) PRIMARY KEY,
+                    watermark_column VARCHAR(50),
+                    watermark DATE,
+                    source_signature TEXT,
+                    updated_at TIMESTAMP
+                )
+                """
+            )
+            cursor.execute(
+                "ALTER TABLE ingestion_watermarks ADD COLUMN IF NOT EXISTS source_signature TEXT"
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def create_customer_summary_table(engine):
+    # Totals per customer, so the dashboard models read O(customers) rows
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS customer_summary (
+                    cust_id INT PRIMARY KEY,
+                    first_date DATE,
+                    last_date DATE,
+                    transactions INT,
+                    orders INT,
+                    revenue DOUBLE PRECISION,
+                    unique_products INT,
+                    updated_at TIMESTAMP
+                )
+                """
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def rebuild_customer_summary(engine):
+    # Recompute every customer from the full sales history
+    start = time.perf_counter()
+    create_customer_summary_table(engine)
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE customer_summary")
+            cursor.execute(
+                f"""
+                INSERT INTO customer_summary (cust_id, first_date, last_date, transactions,
+                                              orders, revenue, unique_products, updated_at)
+                SELECT cust_id, min(date), max(date), count(*), count(DISTINCT transaction_id),
+                       sum(total_price), count(DISTINCT product_id), NOW()
+                FROM ({ENRICHED_SALES_SQL.format(source=SUMMARY_SOURCE, condition="")}) AS e
+                GROUP BY cust_id
+                """
+            )
+            customers = cursor.rowcount
+        connection.commit()
+    finally:
+        connection.close()
+    logger.info(
+        "Rebuilt customer_summary for %d customers in %.2fs",
+        customers,
+        time.perf_counter() - start,
+    )
+
+
+def update_customer_summary(cursor, new_rows):
+    # Fold only the newly inserted sales into the per customer totals. Orders and
+    # products count as new when the customer has no earlier row with them.
+    earlier_rows = f"""
+        AND s.cust_id IN (SELECT cust_id FROM {new_rows})
+        AND NOT EXISTS (
+            SELECT 1 FROM {new_rows} AS n
+            WHERE n.cust_id = s.cust_id AND n.transaction_id = s.transaction_id
+              AND n.product_id = s.product_id AND n.coupon_status = s.coupon_status
+              AND n.coupon_code = s.coupon_code AND n.date = s.date
+        )
+    """
+    cursor.execute(
+        f"""
+        WITH new_sales AS ({ENRICHED_SALES_SQL.format(source=new_rows, condition="")}),
+        earlier_sales AS ({ENRICHED_SALES_SQL.format(source=SUMMARY_SOURCE, condition=earlier_rows)}),
+        flagged AS (
+            SELECT n.*,
+                NOT EXISTS (
+                    SELECT 1 FROM earlier_sales AS e
+                    WHERE e.cust_id = n.cust_id AND e.transaction_id = n.transaction_id
+                ) AS new_order,
+                NOT EXISTS (
+                    SELECT 1 FROM earlier_sales AS e
+                    WHERE e.cust_id = n.cust_id AND e.product_id = n.product_id
+                ) AS new_product
+            FROM new_sales AS n
+        )
+        INSERT INTO customer_summary AS c (cust_id, first_date, last_date, transactions,
+                                           orders, revenue, unique_products, updated_at)
+        SELECT cust_id, min(date), max(date), count(*),
+               count(DISTINCT transaction_id) FILTER (WHERE new_order),
+               sum(total_price),
+               count(DISTINCT product_id) FILTER (WHERE new_product),
+               NOW()
+        FROM flagged
+        GROUP BY cust_id
+        ON CONFLICT (cust_id) DO UPDATE SET
+            first_date = LEAST(c.first_date, EXCLUDED.first_date),
+            last_date = GREATEST(c.last_date, EXCLUDED.last_date),
+            transactions = c.transactions + EXCLUDED.transactions,
+            orders = c.orders + EXCLUDED.orders,
+            revenue = c.revenue + EXCLUDED.revenue,
+            unique_products = c.unique_products + EXCLUDED.unique_products,
+            updated_at = EXCLUDED.updated_at
+        """
+    )
+    return cursor.rowcount
+
+
+def source_signature(table_name):
+    # Size and modification time of the table's CSV files
+    paths = CSV_PATHS[table_name]
+    if not isinstance(paths, list):
+        paths = [paths]
+    return ";".join(
+        f"{path}:{os.stat(path).st_size}:{os.stat(path).st_mtime_ns}" for path in paths
+    )
+
+
+def get_watermark(cursor, table_name, column):
+    # Recorded watermark and source signature. Without a recorded watermark the
+    # table itself is scanned once, later runs advance it from the staged rows.
+    cursor.execute(
+        "SELECT watermark, source_signature FROM ingestion_watermarks WHERE table_name = %s",
+        (table_name,),
+    )
+    watermark, signature = cursor.fetchone() or (None, None)
+    if watermark is None and column:
+        cursor.execute(f"SELECT max({column}) FROM {table_name}")
+        watermark = cursor.fetchone()[0]
+    return watermark, signature
+
+
+def filter_new_rows(chunks, column, watermark, skipped):
+    # Rows on the watermark date itself are kept, ON CONFLICT skips those already
+    # loaded. Older rows are dropped and counted in skipped["rows"].
+    for chunk in chunks:
+        if watermark is not None:
+            dates = pd.to_datetime(chunk[column], format="%Y-%m-%d").dt.date
+            new = dates >= watermark
+            skipped["rows"] += int((~new).sum())
+            chunk = chunk[new]
+        if not chunk.empty:
+            yield chunk
+
+
+def merge_staging(cursor, table_name, staging_name, columns, new_rows=None):
+    # Insert staged rows that are not in the target table yet, optionally
+    # copying the rows that were actually inserted into the new_rows table
+    column_list = ", ".join(columns)
+    if table_name in NATURAL_KEYS:
+        keys = NATURAL_KEYS[table_name]
+        matches = " AND ".join(f"t.{key} = s.{key}" for key in keys)
+        # The earliest delivery of a key wins when the table has a watermark
+        order = list(keys)
+        if table_name in WATERMARK_COLUMNS:
+            order.append(WATERMARK_COLUMNS[table_name])
+        rows = f"""
+            SELECT DISTINCT ON ({", ".join(f"s.{key}" for key in keys)}) {", ".join(f"s.{c}" for c in columns)}
+            FROM {staging_name} AS s
+            WHERE NOT EXISTS (SELECT 1 FROM {table_name} AS t WHERE {matches})
+            ORDER BY {", ".join(f"s.{column}" for column in order)}
+        """
+    else:
+        rows = f"SELECT {column_list} FROM {staging_name}"
+    if new_rows:
+        cursor.execute(
+            f"""
+            WITH inserted AS (
+                INSERT INTO {table_name} ({column_list})
+                {rows}
+                ON CONFLICT DO NOTHING
+                RETURNING {column_list}
+            )
+            INSERT INTO {new_rows} ({column_list})
+            SELECT {column_list} FROM inserted
+            """
+        )
+    else:
+        cursor.execute(
+            f"""
+            INSERT INTO {table_name} ({column_list})
+            {rows}
+            ON CONFLICT DO NOTHING
+            """
+        )
+    return cursor.rowcount
+
+
+def ingest_table(engine, table_name, chunksize):
+    # Stage only the rows past the watermark, then merge them idempotently
+    start = time.perf_counter()
+    column = WATERMARK_COLUMNS.get(table_name)
+    staging_name = f"staging_{table_name}"
+    signature = source_signature(table_name)
+    skipped = {"rows": 0}
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            watermark, last_signature = get_watermark(cursor, table_name, column)
+            if signature == last_signature:
+                # Nothing new to read, e.g. dimension tables between deliveries
+                logger.info("%s: source files unchanged, skipped", table_name)
+                return 0, 0
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging_name} (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            chunks = iter_csv_chunks(table_name, chunksize)
+            if column:
+                chunks = filter_new_rows(chunks, column, watermark, skipped)
+            columns = None
+            staged = 0
+            for chunk in chunks:
+                columns = list(chunk.columns)
+                staged += copy_chunks(cursor, staging_name, [chunk])
+            new_rows = None
+            if table_name == SUMMARY_SOURCE:
+                new_rows = f"new_{table_name}"
+                cursor.execute(
+                    f"CREATE TEMP TABLE {new_rows} (LIKE {table_name}) ON COMMIT DROP"
+                )
+            inserted = (
+                merge_staging(cursor, table_name, staging_name, columns, new_rows)
+                if staged
+                else 0
+            )
+            if new_rows and inserted:
+                # Same transaction, so the totals never miss or double count rows
+                customers = update_customer_summary(cursor, new_rows)
+                logger.info("customer_summary: updated %d customers", customers)
+            # Advanced from the staged rows, never by scanning the target table
+            new_watermark = (
+                f"(SELECT greatest(%(watermark)s::date, max({column})) FROM {staging_name})"
+                if column
+                else "NULL::date"
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO ingestion_watermarks (table_name, watermark_column, watermark,
+                                                  source_signature, updated_at)
+                VALUES (%(table)s, %(column)s, {new_watermark}, %(signature)s, NOW())
+                ON CONFLICT (table_name) DO UPDATE
+                SET watermark = EXCLUDED.watermark,
+                    source_signature = EXCLUDED.source_signature,
+                    updated_at = EXCLUDED.updated_at
+                """,
+                {
+                    "table": table_name,
+                    "column": column,
+                    "watermark": watermark,
+                    "signature": signature,
+                },
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "%s: %d rows staged since watermark %s, %d new rows inserted in %.2fs",
+        table_name,
+        staged,
+        watermark,
+        inserted,
+        elapsed,
+    )
+    if skipped["rows"]:
+        logger.info(
+            "%s: %d rows dated before watermark %s skipped, late rows among them "
+            "are not loaded",
+            table_name,
+            skipped["rows"],
+            watermark,
+        )
+    return staged, inserted
+
+
+def incremental_load_to_db(engine, chunksize=50_000, workers=4):
+    # Same foreign key ordering as the bulk load, but only the delta is written
+    create_watermark_table(engine)
+    create_customer_summary_table(engine)
+    if customer_summary_is_empty(engine):
+        # Start from the full history once, afterwards only new rows are folded in
+        rebuild_customer_summary(engine)
+    stats = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for level in LOAD_ORDER:
+            futures = {
+                table_name: executor.submit(ingest_table, engine, table_name, chunksize)
+                for table_name in level
+            }
+            for table_name, future in futures.items():
+                stats[table_name] = future.result()
+    return stats
+
+
+def customer_summary_is_empty(engine):
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM customer_summary)")
+            return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def refresh_views(engine, concurrently=True):
+    # Create any missing view, then rebuild them without blocking dashboard reads
+    connection = engine.raw_connection()
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            with open(VIEWS_SQL) as f:
+                cursor.execute(f.read())
+            for view in MATERIALIZED_VIEWS:
+                start = time.perf_counter()
+                option = "CONCURRENTLY " if concurrently else ""
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {option}{view}")
+                logger.info("Refreshed %s in %.2fs", view, time.perf_counter() - start)
+    finally:
+        connection.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load the CSV data into Postgres.")
+    parser.add_argument(
+        "--mode",
+        choices=["append", "bulk", "incremental", "refresh-views", "rebuild-summary"],
+        default="append",
+        help="append: DataFrame.to_sql inserts, bulk: parallel COPY FROM STDIN, "
+        "incremental: only rows past each table's watermark, safe to rerun, "
+        "refresh-views: only refresh the materialised views, "
+        "rebuild-summary: recompute customer_summary from the full history.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=50_000,
+        help="Rows per COPY batch in bulk and incremental mode.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Tables loaded in parallel in bulk and incremental mode.",
+    )
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     user, postgres_password, database = get_db_credentials()
     engine = create_db_engine(user, postgres_password, database)
     connect_to_db(engine)
 
-    dataframes = read_csv_files()
-    convert_date_columns(dataframes)
-    insert_data_to_db(dataframes, engine)
+    if args.mode == "refresh-views":
+        refresh_views(engine)
+        return
+
+    if args.mode == "rebuild-summary":
+        rebuild_customer_summary(engine)
+        return
+
+    if args.mode == "bulk":
+        # The tables have to exist already, see data/init.sql
+        stats = bulk_load_to_db(engine, args.chunksize, args.workers)
+        total_rows = sum(rows for rows, _ in stats.values())
+        logger.info("Bulk loaded %d rows into %d tables", total_rows, len(stats))
+    elif args.mode == "incremental":
+        stats = incremental_load_to_db(engine, args.chunksize, args.workers)
+        total_rows = sum(inserted for _, inserted in stats.values())
+        logger.info("Ingested %d new rows into %d tables", total_rows, len(stats))
+    else:
+        dataframes = read_csv_files()
+        convert_date_columns(dataframes)
+        insert_data_to_db(dataframes, engine)
+    if args.mode != "incremental":
+        rebuild_customer_summary(engine)
+    refresh_views(engine)
 
     print("Tables created successfully")
 
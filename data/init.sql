@@ -55,7 +55,56 @@ CREATE TABLE IF NOT EXISTS user_behaviour (
 );
 
 
--- Create the 'online_sales' table
+-- Create one partition per month for a range partitioned table, plus a default
+-- partition catching anything outside the range. Rerun it to add later months.
+-- Postgres refuses to create a partition for a month the default partition
+-- already holds rows of, so those rows are moved into the new partition first.
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent TEXT, first_month DATE, last_month DATE)
+RETURNS VOID AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    default_name TEXT := parent || '_default';
+    key_column TEXT;
+BEGIN
+    SELECT a.attname INTO key_column
+    FROM pg_partitioned_table AS p
+    JOIN pg_attribute AS a ON a.attrelid = p.partrelid AND a.attnum = p.partattrs[0]
+    WHERE p.partrelid = parent::regclass;
+
+    FOR month_start IN
+        SELECT generate_series(date_trunc('month', first_month), date_trunc('month', last_month), INTERVAL '1 month')::DATE
+    LOOP
+        month_end := (month_start + INTERVAL '1 month')::DATE;
+        partition_name := parent || '_' || to_char(month_start, 'YYYY_MM');
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+        IF to_regclass(default_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                partition_name, parent, month_start, month_end
+            );
+        ELSE
+            -- Filled from the default partition while detached, then attached
+            EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS)', partition_name, parent);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM %I WHERE %I >= %L AND %I < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                default_name, key_column, month_start, key_column, month_end, partition_name
+            );
+            EXECUTE format(
+                'ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                parent, partition_name, month_start, month_end
+            );
+        END IF;
+    END LOOP;
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', default_name, parent);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create the 'online_sales' table, partitioned by month. The partition key has
+-- to be part of the primary key, so the table alone no longer rejects the same
+-- sale (cust_id, transaction_id, product_id, coupon_status, coupon_code) under a
+-- second date. data/db_init.py --mode incremental deduplicates on that key.
 CREATE TABLE IF NOT EXISTS online_sales (
     cust_id INT,
     transaction_id INT,
@@ -66,10 +115,12 @@ CREATE TABLE IF NOT EXISTS online_sales (
     discount_percentage NUMERIC(5, 2),
     delivery_charges NUMERIC(10, 2),
     quantity INT,
-    PRIMARY KEY (cust_id, transaction_id, product_id, coupon_status, coupon_code),
+    PRIMARY KEY (cust_id, transaction_id, product_id, coupon_status, coupon_code, date),
     FOREIGN KEY (cust_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
-);
+) PARTITION BY RANGE (date);
+
+SELECT create_monthly_partitions('online_sales', '2018-01-01', '2026-12-01');
 
 -- Create the 'shipping_status' table
 CREATE TABLE IF NOT EXISTS shipping_status (
@@ -87,16 +138,20 @@ CREATE TABLE IF NOT EXISTS shipping_status (
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 );
 
--- Create the 'shipping_history' table
+-- Create the 'shipping_history' table, partitioned by month of update. As for
+-- online_sales, a (shipping_id, status) row can now exist under two update
+-- dates, data/db_init.py --mode incremental deduplicates on that key.
 CREATE TABLE IF NOT EXISTS shipping_history (
     date DATE,
     shipping_id INT,
     status VARCHAR(255),
     ship_service_level VARCHAR(50),
     update_date DATE,
-    PRIMARY KEY (shipping_id, status),
+    PRIMARY KEY (shipping_id, status, update_date),
     FOREIGN KEY (shipping_id) REFERENCES shipping_status(shipping_id) ON DELETE CASCADE
-);
+) PARTITION BY RANGE (update_date);
+
+SELECT create_monthly_partitions('shipping_history', '2018-01-01', '2026-12-01');
 
 -- Insert data into 'products' table
 COPY products(product_id, product_name, about_product, category, actual_price, discounted_price, discount_percentage, img_link, origin_area)
@@ -143,4 +198,12 @@ FROM '/docker-entrypoint-initdb.d/shipping_history.csv' DELIMITER ',' CSV HEADER
 
 -- Convert 'date' and 'update_date' columns in shipping_history to proper date format
 UPDATE shipping_history SET date = TO_DATE(date::text, 'YYYY-MM-DD');
-UPDATE shipping_history SET update_date = TO_DATE(update_date::text, 'YYYY-MM-DD');
\ No newline at end of file
+UPDATE shipping_history SET update_date = TO_DATE(update_date::text, 'YYYY-MM-DD');
+
+-- Secondary indexes, created after the bulk load so COPY does not have to maintain them
+CREATE INDEX IF NOT EXISTS online_sales_product_id_date ON online_sales (product_id, date);
+CREATE INDEX IF NOT EXISTS online_sales_cust_id_date ON online_sales (cust_id, date);
+CREATE INDEX IF NOT EXISTS shipping_history_shipping_id_update_date ON shipping_history (shipping_id, update_date);
+
+ANALYZE online_sales;
+ANALYZE shipping_history;
@@ -0,0 +1,37 @@
+-- Runs after init.sql in docker-entrypoint-initdb.d, and again on every
+-- `python data/db_init.py --mode refresh-views`, so keep it idempotent.
+
+-- Enriched sales fact table read by the customer analysis dashboard
+CREATE MATERIALIZED VIEW IF NOT EXISTS sales_enriched AS
+SELECT
+    s.cust_id,
+    s.transaction_id,
+    s.date,
+    s.product_id,
+    s.coupon_status,
+    s.coupon_code,
+    s.discount_percentage,
+    s.quantity,
+    p.category,
+    p.actual_price,
+    u.age,
+    u.gender,
+    (CASE
+        WHEN s.coupon_status = 'Used'
+            THEN s.quantity * p.actual_price * (1 - s.discount_percentage)
+        ELSE s.quantity * p.actual_price
+    END)::DOUBLE PRECISION AS total_price
+FROM online_sales AS s
+JOIN products AS p ON p.product_id = s.product_id
+JOIN users AS u ON u.user_id = s.cust_id
+-- Only rated products, as a semi join so multiple ratings never duplicate sales
+WHERE EXISTS (SELECT 1 FROM ratings AS r WHERE r.product_id = s.product_id);
+
+-- REFRESH ... CONCURRENTLY needs a unique index on the view, on the same
+-- columns as the online_sales primary key so every base row fits
+DROP INDEX IF EXISTS sales_enriched_key;
+CREATE UNIQUE INDEX IF NOT EXISTS sales_enriched_key_date
+    ON sales_enriched (cust_id, transaction_id, product_id, coupon_status, coupon_code, date);
+
+CREATE INDEX IF NOT EXISTS sales_enriched_cust_id_date
+    ON sales_enriched (cust_id, date);
@@ -1,7 +1,13 @@
 import base64
 import streamlit as st
 from tabs.tab1a import display_tab1a
-from tabs.tab2a import load_data_jj, display_tab2a, display_tab2b, display_tab2c
+from tabs.tab2a import (
+    load_data_jj,
+    display_tab2a,
+    display_tab2b,
+    display_tab2c,
+    display_tab2d,
+)
 from tabs.tab3a import (
     load_data_wy,
     display_tab3a,
@@ -11,6 +17,18 @@ from tabs.tab3a import (
     display_tab3e,
 )
 
+TABS = [
+    "🔍Customer Analysis",
+    "📉 Customer Churn Rates",
+    "📬Marketing Channel Analysis",
+]
+
+
+@st.fragment
+def display_section(display, *args):
+    """Render one section as a fragment, so its widgets only rerun that section."""
+    display(st.container(), *args)
+
 
 def main():
     """Main function to run the Streamlit app."""
@@ -23,30 +41,36 @@ def main():
     st.page_link("Hello.py", label="⬅ BACK")
     st.markdown("# Subgroup A")
 
-    tab1, tab2, tab3 = st.tabs(
-        [
-            "🔍Customer Analysis",
-            "📉 Customer Churn Rates",
-            "📬Marketing Channel Analysis",
-        ]
+    # Unlike st.tabs, only the selected tab is computed on each run. Data and
+    # models are shared through the dataset registry, so revisiting a tab is cheap.
+    selected_tab = st.radio(
+        "Tab",
+        TABS,
+        horizontal=True,
+        label_visibility="collapsed",
+        key="subgroup_a_tab",
     )
 
-    # Display content for tab1
-    display_tab1a(tab1)
-
-    # Display content for tab2
-    df_jj = load_data_jj()
-    display_tab2a(tab2, df_jj)
-    display_tab2b(tab2, df_jj)
-    display_tab2c(tab2, df_jj)
-
-    # Display content for tab3
-    sales_data = load_data_wy()
-    display_tab3a(tab3, sales_data)
-    display_tab3b(tab3, sales_data)
-    display_tab3c(tab3, sales_data)
-    display_tab3d(tab3, sales_data)
-    display_tab3e(tab3, sales_data)
+    if selected_tab == TABS[0]:
+        # Display content for tab1
+        display_section(display_tab1a)
+
+    elif selected_tab == TABS[1]:
+        # Display content for tab2
+        df_jj = load_data_jj()
+        display_section(display_tab2a, df_jj)
+        display_section(display_tab2b, df_jj)
+        display_section(display_tab2c, df_jj)
+        display_section(display_tab2d, df_jj)
+
+    else:
+        # Display content for tab3
+        sales_data = load_data_wy()
+        display_section(display_tab3a, sales_data)
+        display_section(display_tab3b, sales_data)
+        display_section(display_tab3c, sales_data)
+        display_section(display_tab3d, sales_data)
+        display_section(display_tab3e, sales_data)
 
 
 if __name__ == "__main__":
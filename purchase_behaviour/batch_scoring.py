@@ -0,0 +1,239 @@
+"""Score every customer with CLTV, expected purchases and RFM segment.
+
+Customers are scored in chunks across a process pool and written to the
+customer_scores table, which the dashboard and the API read instead of scoring
+customers on every request. With --bootstrap the 90% CLTV intervals of
+bootstrap_cltv.py are stored next to the CLTV they belong to. Meant to be run
+on a schedule, e.g. nightly.
+
+Usage:
+    python purchase_behaviour/batch_scoring.py [--chunksize 10000] [--workers 4] [--bootstrap 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchase_behaviour.bootstrap_cltv import bootstrap_cltv
+from purchase_behaviour.customer_features import (
+    customer_summary,
+    fit_summary_models,
+    load_customer_totals,
+    rfm_table,
+)
+from purchase_behaviour.expected_purchases import expected_purchases_matrix
+from purchase_behaviour.model_store import (
+    CLTV_MONTHS,
+    DISCOUNT_RATE,
+    fingerprint,
+    fitter_params,
+    get_models,
+    restore_fitter,
+)
+from tabs.db import get_db_connection, read_sql
+from tabs.schema import apply_schema
+
+# Same CLTV segments as the customer analysis tab
+EXPECTED_PURCHASES_WEEKS = 12
+CLTV_BINS = [0, 10000, 100000, 1000000, float("inf")]
+CLTV_LABELS = ["Low", "Medium", "High", "Top"]
+# Bounds of the bootstrap CLTV interval, empty unless run with --bootstrap
+INTERVALS = ["clv_lower", "clv_upper"]
+
+COLUMNS = [
+    "cust_id",
+    "recency_days",
+    "frequency",
+    "monetary",
+    "rfm_score",
+    "rfm_segment",
+    "expected_purchases",
+    "expected_average_profit",
+    "clv",
+    "clv_lower",
+    "clv_upper",
+    "clv_segment",
+    "model_fingerprint",
+    "scored_at",
+]
+
+CREATE_TABLE = """
+    CREATE TABLE {table} (
+        cust_id INTEGER PRIMARY KEY,
+        recency_days INTEGER,
+        frequency INTEGER,
+        monetary DOUBLE PRECISION,
+        rfm_score INTEGER,
+        rfm_segment VARCHAR(10),
+        expected_purchases DOUBLE PRECISION,
+        expected_average_profit DOUBLE PRECISION,
+        clv DOUBLE PRECISION,
+        clv_lower DOUBLE PRECISION,
+        clv_upper DOUBLE PRECISION,
+        clv_segment VARCHAR(10),
+        model_fingerprint VARCHAR(40),
+        scored_at TIMESTAMP
+    )
+"""
+
+
+def load_sales():
+    """Read the enriched sales straight from the materialised view."""
+    sales = read_sql(
+        "SELECT cust_id, transaction_id, date, product_id, total_price "
+        "FROM sales_enriched"
+    )
+    return apply_schema(sales, "sales_enriched")
+
+
+def score_chunk(summary, bgf_params, ggf_params):
+    """Expected purchases and CLTV of a chunk of modelled customers (in a worker)."""
+    bgf = restore_fitter(*bgf_params)
+    ggf = restore_fitter(*ggf_params)
+    scores = pd.DataFrame(index=summary.index)
+    scores["expected_purchases"] = expected_purchases_matrix(
+        bgf,
+        summary["frequency"],
+        summary["recency"],
+        summary["T"],
+        [EXPECTED_PURCHASES_WEEKS],
+    )[:, 0]
+    scores["expected_average_profit"] = ggf.conditional_expected_average_profit(
+        summary["frequency"], summary["monetary"]
+    )
+    scores["clv"] = ggf.customer_lifetime_value(
+        bgf,
+        summary["frequency"],
+        summary["recency"],
+        summary["T"],
+        summary["monetary"],
+        time=CLTV_MONTHS,
+        freq="W",
+        discount_rate=DISCOUNT_RATE,
+    )
+    return scores
+
+
+def score_customers(totals, chunksize=10_000, workers=None, replicates=0):
+    """Score every customer in the totals, modelled customers in parallel chunks.
+
+    With replicates, the CLTV intervals are bootstrapped from the same summary.
+    """
+    rfm = rfm_table(totals)
+    summary = customer_summary(totals)
+    # Refit in the foreground so the scores always match the current transactions
+    bgf, ggf = get_models(
+        "customer_models", summary, fit_summary_models, background=False
+    )
+    model_fingerprint = fingerprint(summary)
+
+    chunks = [
+        summary.iloc[i : i + chunksize] for i in range(0, len(summary), chunksize)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            score_chunk,
+            chunks,
+            [fitter_params(bgf)] * len(chunks),
+            [fitter_params(ggf)] * len(chunks),
+        )
+        model_scores = pd.concat(list(results)) if chunks else pd.DataFrame()
+
+    model_scores = model_scores.reindex(columns=[*model_scores.columns, *INTERVALS])
+    if replicates and chunks:
+        intervals = bootstrap_cltv(summary, replicates=replicates, workers=workers)
+        model_scores[INTERVALS] = intervals[INTERVALS]
+
+    # Customers without repeat purchases on different days are not modelled and
+    # keep empty model scores, but still get their RFM segment
+    scores = rfm.join(model_scores, how="left")
+    scores = scores.rename(
+        columns={
+            "Recency": "recency_days",
+            "Frequency": "frequency",
+            "Monetary": "monetary",
+            "RFM_Score": "rfm_score",
+            "Segment": "rfm_segment",
+        }
+    )
+    scores["clv_segment"] = pd.cut(
+        scores["clv"], bins=CLTV_BINS, labels=CLTV_LABELS, right=False
+    )
+    scores["model_fingerprint"] = np.where(
+        scores["clv"].notna(), model_fingerprint, None
+    )
+    scores["scored_at"] = pd.Timestamp.now().floor("s")
+    return scores.reset_index()[COLUMNS]
+
+
+def write_scores(scores):
+    """Replace customer_scores in one transaction, readers never see a partial table."""
+    buffer = StringIO()
+    scores.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS customer_scores_new")
+            cur.execute(CREATE_TABLE.format(table="customer_scores_new"))
+            cur.copy_expert(
+                f"COPY customer_scores_new ({', '.join(COLUMNS)}) FROM STDIN WITH CSV",
+                buffer,
+            )
+            cur.execute("DROP TABLE IF EXISTS customer_scores")
+            cur.execute("ALTER TABLE customer_scores_new RENAME TO customer_scores")
+            cur.execute(
+                "ALTER INDEX customer_scores_new_pkey RENAME TO customer_scores_pkey"
+            )
+            cur.execute(
+                "CREATE INDEX customer_scores_clv ON customer_scores (clv DESC NULLS LAST)"
+            )
+            cur.execute("ANALYZE customer_scores")
+
+
+def run(chunksize=10_000, workers=None, replicates=0):
+    start = time.monotonic()
+    # One row per customer from customer_summary, all sales only as a fallback
+    totals, _ = load_customer_totals()
+    loaded = time.monotonic()
+    scores = score_customers(
+        totals, chunksize=chunksize, workers=workers, replicates=replicates
+    )
+    scored = time.monotonic()
+    write_scores(scores)
+    print(
+        f"Scored {len(scores)} customers "
+        f"({scores['clv'].notna().sum()} modelled): load {loaded - start:.1f}s, "
+        f"score {scored - loaded:.1f}s, write {time.monotonic() - scored:.1f}s"
+    )
+    return scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=10_000,
+        help="Customers scored per task.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes, defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        help="Bootstrap replicates for 90%% CLTV intervals, 0 to skip them.",
+    )
+    args = parser.parse_args()
+    run(chunksize=args.chunksize, workers=args.workers, replicates=args.bootstrap)
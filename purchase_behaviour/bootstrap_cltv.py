@@ -0,0 +1,174 @@
+"""Bootstrap confidence intervals for the predicted CLTV of every customer.
+
+Each replicate refits the BG/NBD and Gamma-Gamma models on customers resampled
+with replacement and predicts the CLTV of all customers with them. Replicates
+run on a process pool; the customer summary, the resampling indices and the
+predictions live in shared memory, so workers neither receive nor send copies
+of them.
+
+The dashboard shows the intervals stored by the batch scoring job
+(`batch_scoring.py --bootstrap 200`), this script only reports them.
+
+Usage:
+    python purchase_behaviour/bootstrap_cltv.py [--replicates 200] [--workers 4]
+"""
+
+import argparse
+import atexit
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchase_behaviour.customer_features import (
+    customer_summary,
+    fit_summary_models,
+    load_customer_totals,
+)
+from purchase_behaviour.model_store import CLTV_MONTHS, DISCOUNT_RATE, SUMMARY_COLUMNS
+
+# Shared arrays as seen by a worker process, name -> (block, array)
+_shared = {}
+
+
+def _create(blocks, name, shape, dtype):
+    """Allocate an array in a new shared memory block owned by the caller."""
+    block = shared_memory.SharedMemory(
+        create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    )
+    blocks[name] = block
+    return np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _detach():
+    # Unmap the worker's views of the blocks on exit, the parent unlinks them
+    blocks = [block for block, _ in _shared.values()]
+    _shared.clear()
+    for block in blocks:
+        block.close()
+
+
+def _attach(layout):
+    """Worker initializer, maps the parent's shared arrays into this process."""
+    atexit.register(_detach)
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _shared[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+
+
+def fit_replicate(replicate):
+    """Refit on one resample and store the CLTV of every customer (in a worker)."""
+    summary = _shared["summary"][1]
+    sample = summary[:, _shared["indices"][1][replicate]]
+    clv = _shared["clv"][1][replicate]
+    try:
+        bgf, ggf = fit_summary_models(pd.DataFrame(dict(zip(SUMMARY_COLUMNS, sample))))
+        frequency, recency, T, monetary = (pd.Series(row) for row in summary)
+        clv[:] = ggf.customer_lifetime_value(
+            bgf,
+            frequency,
+            recency,
+            T,
+            monetary,
+            time=CLTV_MONTHS,
+            freq="W",
+            discount_rate=DISCOUNT_RATE,
+        ).to_numpy()
+    except Exception as e:
+        # A resample the models do not converge on is left out of the intervals
+        print(f"Bootstrap replicate {replicate} failed: {str(e).strip()}")
+        clv[:] = np.nan
+        return False
+    return True
+
+
+def bootstrap_cltv(summary, replicates=200, confidence=0.9, workers=None, seed=0):
+    """Per customer CLTV intervals from refitting the models on resampled customers.
+
+    summary is the customer summary the models are trained on (customer_summary in
+    purchase_behaviour/customer_features.py). Returns a frame indexed like it with the median CLTV over the
+    replicates and the lower and upper bounds of the confidence interval. The
+    predictions take replicates * customers * 8 bytes of shared memory.
+    """
+    n = len(summary)
+    blocks = {}
+    try:
+        arrays = {
+            "summary": _create(
+                blocks, "summary", (len(SUMMARY_COLUMNS), n), np.float64
+            ),
+            "indices": _create(blocks, "indices", (replicates, n), np.int32),
+            "clv": _create(blocks, "clv", (replicates, n), np.float64),
+        }
+        arrays["summary"][:] = summary[SUMMARY_COLUMNS].to_numpy(dtype=np.float64).T
+        # All resamples drawn up front, so the result only depends on the seed
+        arrays["indices"][:] = np.random.default_rng(seed).integers(
+            n, size=(replicates, n)
+        )
+
+        layout = {
+            name: (blocks[name].name, array.shape, array.dtype)
+            for name, array in arrays.items()
+        }
+        # Spawned, not forked: callers may be multi-threaded servers
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_attach,
+            initargs=(layout,),
+        ) as executor:
+            fitted = sum(executor.map(fit_replicate, range(replicates)))
+        if not fitted:
+            raise RuntimeError("No bootstrap replicate could be fitted")
+
+        tail = (1 - confidence) / 2 * 100
+        lower, median, upper = np.nanpercentile(
+            arrays["clv"], [tail, 50, 100 - tail], axis=0
+        )
+    finally:
+        arrays = None
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+    return pd.DataFrame(
+        {"clv_lower": lower, "clv_median": median, "clv_upper": upper},
+        index=summary.index,
+    )
+
+
+def run(replicates=200, workers=None):
+    start = time.monotonic()
+    totals, _ = load_customer_totals()
+    summary = customer_summary(totals)
+    loaded = time.monotonic()
+    intervals = bootstrap_cltv(summary, replicates=replicates, workers=workers)
+    width = intervals["clv_upper"] - intervals["clv_lower"]
+    print(
+        f"Bootstrapped {replicates} replicates for {len(intervals)} customers: "
+        f"load {loaded - start:.1f}s, bootstrap {time.monotonic() - loaded:.1f}s, "
+        f"median interval width {width.median():.2f}"
+    )
+    return intervals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--replicates",
+        type=int,
+        default=200,
+        help="Number of bootstrap resamples.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes, defaults to the number of CPUs.",
+    )
+    args = parser.parse_args()
+    run(replicates=args.replicates, workers=args.workers)
@@ -0,0 +1,294 @@
+import datetime as dt
+import os
+
+import numpy as np
+import pandas as pd
+from lifetimes import BetaGeoFitter, GammaGammaFitter
+
+from purchase_behaviour.quantile_sketch import (
+    RFM_QUANTILES,
+    merge_rfm_sketches,
+    rfm_ranks,
+    sketch_rfm,
+)
+from tabs.registry import dataset, data_version, get, report_once
+from tabs.db import read_sql
+from tabs.schema import apply_schema
+from tabs.snapshot import load_table
+
+
+# function to create df
+def create_df(table_name):
+    try:
+        # Served from the local snapshot unless the table changed since the last pull
+        df = load_table(table_name)
+        if table_name == "users":
+            df = df.rename(columns={"user_id": "cust_id"})
+        return df
+    except Exception as e:
+        print("An error occurred:", e)
+
+
+def create_full_table():
+    # Sales joined with products and users, total_price is computed by Postgres
+    # in the sales_enriched materialised view (data/views.sql)
+    full_table = create_df("sales_enriched")
+    full_table["date"] = pd.to_datetime(full_table["date"], errors="coerce")
+    return full_table
+
+
+# built once per data version and shared read-only by RFM, CLTV and BG/NBD
+@dataset("enriched_sales", tables=["sales_enriched"])
+def load_enriched_sales():
+    return create_full_table()
+
+
+# Set a dummy reference date for recency calculations
+REFERENCE_DATE = dt.datetime(2020, 1, 1)
+
+# "exact" ranks RFM with pd.qcut, "sketch" with merged quantile sketches per chunk
+rfm_quantiles = os.getenv("RFM_QUANTILES", "exact")
+RFM_CHUNKSIZE = 1_000_000
+RFM_SEGMENTS = ["Low", "Medium", "High", "Top"]
+
+
+def day_number(dates):
+    """Days since 1970-01-01 as int64, for dates, datetime columns or a single date.
+
+    Missing dates are not representable and come out as the smallest int64, so
+    callers drop them first.
+    """
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def customer_totals(sales):
+    """Per customer aggregates every chart and model is derived from.
+
+    One groupby with named aggregations over int64 day numbers, so no per group
+    Python code runs: first and last purchase day, sales rows, distinct orders,
+    revenue and distinct products.
+    """
+    # NaT would become the smallest int64 and corrupt first_day, last_day and
+    # everything derived from them, so undated rows are left out
+    sales = sales[sales["date"].notna()]
+    columns = sales[["cust_id", "transaction_id", "product_id", "total_price"]]
+    return (
+        columns.assign(day=day_number(sales["date"]))
+        .groupby("cust_id")
+        .agg(
+            first_day=("day", "min"),
+            last_day=("day", "max"),
+            transactions=("transaction_id", "count"),
+            orders=("transaction_id", "nunique"),
+            revenue=("total_price", "sum"),
+            unique_products=("product_id", "nunique"),
+        )
+    )
+
+
+def _summary_totals(summary):
+    # customer_summary rows in the layout of customer_totals
+    summary = summary[summary["first_date"].notna() & summary["last_date"].notna()]
+    return pd.DataFrame(
+        {
+            "first_day": day_number(summary["first_date"]),
+            "last_day": day_number(summary["last_date"]),
+            "transactions": summary["transactions"].to_numpy(dtype=np.int64),
+            "orders": summary["orders"].to_numpy(dtype=np.int64),
+            "revenue": summary["revenue"].to_numpy(dtype=np.float64),
+            "unique_products": summary["unique_products"].to_numpy(dtype=np.int64),
+        },
+        index=pd.Index(summary["cust_id"], name="cust_id"),
+    )
+
+
+def summary_table_totals():
+    """Customer totals read from the customer_summary table kept by data/db_init.py.
+
+    The table is updated from the newly ingested sales only, so this reads one row
+    per customer instead of every sales row.
+    """
+    return _summary_totals(load_table("customer_summary").sort_values("cust_id"))
+
+
+# One page of customer_summary after a given customer, in customer order
+SUMMARY_PAGE_SQL = """
+    SELECT cust_id, first_date, last_date, transactions, orders, revenue, unique_products
+    FROM customer_summary
+    WHERE %(after)s::integer IS NULL OR cust_id > %(after)s
+    ORDER BY cust_id
+    LIMIT %(limit)s
+"""
+
+
+def customer_totals_chunks(chunksize=RFM_CHUNKSIZE):
+    """Yield the customer totals a page of chunksize customers at a time.
+
+    Pages are read straight from customer_summary, so only one of them is held in
+    memory. Without the table the totals aggregated from the sales are sliced.
+    """
+
+    def read_page(after):
+        page = read_sql(SUMMARY_PAGE_SQL, params={"after": after, "limit": chunksize})
+        return apply_schema(page, "customer_summary")
+
+    try:
+        page = read_page(None)
+    except Exception as e:
+        report_once("customer_summary is not available:", e)
+        page = None
+    if page is None or page.empty:
+        totals, _ = load_customer_totals()
+        for i in range(0, len(totals), chunksize):
+            yield totals.iloc[i : i + chunksize]
+        return
+    while not page.empty:
+        yield _summary_totals(page)
+        page = read_page(int(page["cust_id"].iloc[-1]))
+
+
+def load_customer_totals():
+    """Return the customer totals and their data version.
+
+    Prefers the customer_summary table and falls back to aggregating the enriched
+    sales when the table has not been created or filled yet.
+    """
+    try:
+        version = data_version(tables=["customer_summary"])
+        totals = get("customer_summary_totals", summary_table_totals, version=version)
+        if len(totals):
+            return totals, f"customer_summary/{version}"
+    except Exception as e:
+        report_once("customer_summary is not available:", e)
+    version = data_version(tables=["sales_enriched"])
+    totals = get(
+        "customer_totals",
+        lambda: customer_totals(load_enriched_sales()),
+        version=version,
+    )
+    return totals, f"sales_enriched/{version}"
+
+
+def rfm_values(totals):
+    return pd.DataFrame(
+        {
+            "Recency": day_number(REFERENCE_DATE) - totals["last_day"],
+            "Frequency": totals["transactions"],
+            "Monetary": totals["revenue"],
+        }
+    )
+
+
+def rfm_segments(rfm):
+    rfm["RFM_Score"] = (
+        rfm["Recency_rank"].astype(int)
+        + rfm["Frequency_rank"].astype(int)
+        + rfm["Monetary_rank"].astype(int)
+    )
+
+    # Customer segmentation based on RFM score
+    rfm["Segment"] = pd.cut(
+        rfm["RFM_Score"],
+        bins=[2, 5, 8, 11, 15],
+        labels=RFM_SEGMENTS,
+    )
+    return rfm
+
+
+def rfm_table(totals, quantiles=None):
+    """RFM values, ranks and segment of every customer in the totals.
+
+    quantiles is "exact" to rank with pd.qcut or "sketch" to rank chunks of
+    RFM_CHUNKSIZE customers against merged quantile sketches, RFM_QUANTILES by
+    default.
+    """
+    if (quantiles or rfm_quantiles) == "sketch":
+        chunks = [
+            totals.iloc[i : i + RFM_CHUNKSIZE]
+            for i in range(0, len(totals), RFM_CHUNKSIZE)
+        ]
+        return pd.concat(streaming_rfm_table(lambda: chunks))
+
+    rfm = rfm_values(totals)
+    # Rank each customer for Recency, Frequency, and Monetary
+    rfm["Recency_rank"] = pd.qcut(rfm["Recency"], 5, labels=[5, 4, 3, 2, 1])
+    rfm["Frequency_rank"] = pd.qcut(
+        rfm["Frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5]
+    )
+    rfm["Monetary_rank"] = pd.qcut(
+        rfm["Monetary"].astype(float), 5, labels=[1, 2, 3, 4, 5]
+    )  # Ensuring Monetary is float
+    return rfm_segments(rfm)
+
+
+def streaming_rfm_table(load_chunks, k=200):
+    """Yield the RFM table chunk by chunk, for customer bases too big to sort at once.
+
+    load_chunks() must return a fresh iterable of customer totals chunks, it is
+    called twice: once to build and merge quantile sketches of the Recency,
+    Frequency and Monetary columns, once to rank every chunk against the merged
+    quintile edges. Only one chunk and the sketches are held in memory.
+    """
+    sketches = merge_rfm_sketches(
+        sketch_rfm(rfm_values(chunk), k) for chunk in load_chunks()
+    )
+    if sketches is None:
+        return
+    edges = {
+        column: sketch.quantiles(RFM_QUANTILES) for column, sketch in sketches.items()
+    }
+    for chunk in load_chunks():
+        rfm = rfm_values(chunk)
+        yield rfm_segments(rfm.join(rfm_ranks(rfm, edges)))
+
+
+def rfm_segment_sizes(totals, quantiles=None, load_chunks=customer_totals_chunks):
+    """Number of customers in each RFM segment, Low to Top.
+
+    In sketch mode the totals are not used: the chunks of load_chunks() are ranked
+    and counted one at a time, so memory is bounded by the chunk size rather than
+    the number of customers.
+    """
+    if (quantiles or rfm_quantiles) == "sketch":
+        counts = pd.Series(0, index=RFM_SEGMENTS)
+        for rfm in streaming_rfm_table(load_chunks):
+            counts = counts.add(rfm["Segment"].value_counts(), fill_value=0)
+        return counts.astype(np.int64).reindex(RFM_SEGMENTS)
+    return rfm_table(totals, "exact")["Segment"].value_counts().reindex(RFM_SEGMENTS)
+
+
+def customer_summary(totals):
+    today_date = dt.datetime(2020, 1, 1)
+
+    cltv_prediction = pd.DataFrame(
+        {
+            "frequency": totals["orders"],
+            "monetary": totals["revenue"] / totals["orders"],
+            "recency": totals["last_day"] - totals["first_day"],
+            "T": day_number(today_date) - totals["first_day"],
+        }
+    )
+
+    # he BG/NBD model assumes that customers have already made some repeat purchases to establish a purchasing pattern.
+    # When frequency is 0, there isn’t enough data for the model to make reliable predictions about future transactions hence, remove frequency = 0
+    cltv_prediction = cltv_prediction[(cltv_prediction["frequency"] > 1)]
+    # some users have multiple transactions on only one day
+    cltv_prediction = cltv_prediction[(cltv_prediction["recency"] > 0)]
+
+    cltv_prediction["T"] = cltv_prediction["T"] / 7
+    cltv_prediction["recency"] = cltv_prediction["recency"] / 7
+
+    return cltv_prediction
+
+
+# gamma-gamma model
+def gamma_gamma(df):
+    ggf = GammaGammaFitter(penalizer_coef=0.01)
+    ggf.fit(df["frequency"], df["monetary"])
+    return ggf
+
+
+def fit_summary_models(df):
+    bgf = BetaGeoFitter(penalizer_coef=0.001)
+    bgf.fit(df["frequency"], df["recency"], df["T"])
+    return bgf, gamma_gamma(df)
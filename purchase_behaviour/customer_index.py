@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from purchase_behaviour.customer_features import (
+    customer_summary,
+    fit_summary_models,
+    load_customer_totals,
+    rfm_table,
+)
+from purchase_behaviour.expected_purchases import expected_purchases_matrix
+from purchase_behaviour.model_store import CLTV_MONTHS, DISCOUNT_RATE, get_models
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two checks of the data version by the background refresher
+refresh_interval = float(os.getenv("CUSTOMER_INDEX_REFRESH", "30"))
+
+
+class CustomerIndex:
+    """Per customer RFM, model summary and CLTV held in sorted NumPy arrays.
+
+    A lookup is a binary search over the customer ids followed by plain array
+    indexing, so serving a customer never touches pandas or the database.
+    Expected purchases are evaluated for the looked up customer alone, at
+    whatever horizon is asked for.
+    """
+
+    def __init__(self, rfm, summary, bgf, ggf, version=None):
+        self.version = version
+        rfm = rfm.sort_index()
+        self.cust_ids = rfm.index.to_numpy(dtype=np.int64)
+        self.recency_days = rfm["Recency"].to_numpy(dtype=np.int64)
+        self.rfm_score = rfm["RFM_Score"].to_numpy(dtype=np.int64)
+        segments = rfm["Segment"].astype(object)
+        self.segments = segments.where(segments.notna(), None).to_numpy()
+
+        # Customers left out of the model keep NaN model inputs and scores
+        summary = summary.reindex(rfm.index)
+        self.frequency = summary["frequency"].to_numpy(dtype=float)
+        self.recency = summary["recency"].to_numpy(dtype=float)
+        self.T = summary["T"].to_numpy(dtype=float)
+        self.monetary = summary["monetary"].to_numpy(dtype=float)
+        self.modelled = ~np.isnan(self.frequency)
+
+        self.bgf = bgf
+        self.clv = np.full(len(self.cust_ids), np.nan)
+        if self.modelled.any():
+            modelled = summary[self.modelled]
+            self.clv[self.modelled] = ggf.customer_lifetime_value(
+                bgf,
+                modelled["frequency"],
+                modelled["recency"],
+                modelled["T"],
+                modelled["monetary"],
+                time=CLTV_MONTHS,
+                freq="W",
+                discount_rate=DISCOUNT_RATE,
+            ).to_numpy()
+
+    def __len__(self):
+        return len(self.cust_ids)
+
+    def _expected_purchases(self, i, weeks):
+        return expected_purchases_matrix(
+            self.bgf,
+            self.frequency[i : i + 1],
+            self.recency[i : i + 1],
+            self.T[i : i + 1],
+            [weeks],
+        )[0, 0]
+
+    def position(self, cust_id):
+        """Row of the customer in the arrays, or None if the customer is unknown."""
+        i = np.searchsorted(self.cust_ids, cust_id)
+        if i < len(self.cust_ids) and self.cust_ids[i] == cust_id:
+            return i
+        return None
+
+    def lookup(self, cust_id, weeks=12):
+        """Return the RFM score, segment, expected purchases and CLTV of a customer."""
+        i = self.position(cust_id)
+        if i is None:
+            return None
+        modelled = bool(self.modelled[i])
+        return {
+            "cust_id": int(cust_id),
+            "recency_days": int(self.recency_days[i]),
+            "rfm_score": int(self.rfm_score[i]),
+            "rfm_segment": self.segments[i],
+            "modelled": modelled,
+            "weeks": weeks,
+            "expected_purchases": (
+                float(self._expected_purchases(i, weeks)) if modelled else None
+            ),
+            "clv": float(self.clv[i]) if modelled else None,
+        }
+
+
+def build_index(totals, version=None):
+    """Build the index from the customer totals and the stored customer models."""
+    summary = customer_summary(totals)
+    # Index builds already run in the background, so refit right here if needed
+    bgf, ggf = get_models(
+        "customer_models", summary, fit_summary_models, background=False
+    )
+    return CustomerIndex(rfm_table(totals), summary, bgf, ggf, version=version)
+
+
+_index = None
+_ready = threading.Event()
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh():
+    global _index
+    try:
+        # Read from customer_summary, kept up to date by the incremental loads
+        totals, version = load_customer_totals()
+        if _index is None or version != _index.version:
+            _index = build_index(totals, version)
+    except Exception:
+        # Keep serving the current index while the database cannot be reached
+        logger.exception("Rebuilding the customer index failed")
+
+
+def _refresh_forever():
+    while True:
+        _refresh()
+        _ready.set()
+        time.sleep(refresh_interval)
+
+
+def start_refresher():
+    """Build the index and keep it up to date from a background thread.
+
+    The data version is checked every refresh_interval seconds in that thread,
+    so requests never wait on the database. Starts one thread per process.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_refresh_forever, daemon=True)
+            _refresher.start()
+
+
+def get_customer_index():
+    """Return the process-wide index, waiting for the first build if needed."""
+    if _index is None:
+        start_refresher()
+        _ready.wait()
+        if _index is None:
+            raise RuntimeError("The customer index could not be built")
+    return _index
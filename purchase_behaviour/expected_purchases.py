@@ -0,0 +1,48 @@
+import numpy as np
+from scipy.special import hyp2f1
+
+
+def expected_purchases_matrix(bgf, frequency, recency, T, horizons):
+    """Expected repeat purchases of every customer up to every horizon.
+
+    Evaluates equation (10) of Fader, Hardie and Lee (2005), the same formula as
+    BetaGeoFitter.conditional_expected_number_of_purchases_up_to_time, for all
+    horizons at once by broadcasting customers (rows) against horizons (columns).
+
+    Returns an array of shape (len(frequency), len(horizons)).
+    """
+    r, alpha, a, b = (bgf.params_[key] for key in ("r", "alpha", "a", "b"))
+    x = np.asarray(frequency, dtype=float)[:, None]
+    recency = np.asarray(recency, dtype=float)[:, None]
+    T = np.asarray(T, dtype=float)[:, None]
+    t = np.asarray(horizons, dtype=float)[None, :]
+
+    _a = r + x
+    _b = b + x
+    _c = a + b + x - 1
+    _z = t / (alpha + T + t)
+    with np.errstate(divide="ignore"):
+        ln_hyp_term = np.log(hyp2f1(_a, _b, _c, _z))
+        # Equivalent form for the entries where the first one overflows
+        overflow = np.isinf(ln_hyp_term)
+        if overflow.any():
+            ln_hyp_term_alt = np.log(hyp2f1(_c - _a, _c - _b, _c, _z)) + (
+                _c - _a - _b
+            ) * np.log(1 - _z)
+            ln_hyp_term = np.where(overflow, ln_hyp_term_alt, ln_hyp_term)
+
+    first_term = (a + b + x - 1) / (a - 1)
+    second_term = 1 - np.exp(ln_hyp_term + _a * np.log((alpha + T) / (alpha + t + T)))
+    denominator = (
+        1 + (x > 0) * (a / (b + x - 1)) * ((alpha + T) / (alpha + recency)) ** _a
+    )
+    return first_term * second_term / denominator
+
+
+def expected_transactions_curve(bgf, df, num_weeks):
+    """Per customer matrix and total expected transactions for weeks 1..num_weeks."""
+    horizons = np.arange(1, num_weeks + 1)
+    matrix = expected_purchases_matrix(
+        bgf, df["frequency"], df["recency"], df["T"], horizons
+    )
+    return matrix, matrix.sum(axis=0)
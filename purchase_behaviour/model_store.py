@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+from lifetimes import BetaGeoFitter, GammaGammaFitter
+
+logger = logging.getLogger(__name__)
+
+# Fitted parameters are kept next to the project unless MODEL_STORE_DIR says otherwise
+model_store_dir = os.getenv(
+    "MODEL_STORE_DIR",
+    os.path.join(os.path.dirname(__file__), "..", ".cache", "models"),
+)
+
+FITTERS = {"BetaGeoFitter": BetaGeoFitter, "GammaGammaFitter": GammaGammaFitter}
+# Columns of the customer summary the BG/NBD and Gamma-Gamma models are trained on
+SUMMARY_COLUMNS = ["frequency", "recency", "T", "monetary"]
+# CLTV settings shared by the dashboard, the batch scores and the API lookups
+CLTV_MONTHS = 3
+DISCOUNT_RATE = 0.01
+PROFIT_MARGIN = 0.20
+
+_models = {}  # model name -> (fingerprint, fitters)
+_refits = {}  # model name -> background refit thread
+_lock = threading.Lock()
+
+
+def fingerprint(summary):
+    """Hash of the per customer summary, changes as soon as new transactions arrive."""
+    columns = [column for column in SUMMARY_COLUMNS if column in summary.columns]
+    hashes = pd.util.hash_pandas_object(summary[columns], index=True)
+    return hashlib.sha1(hashes.values.tobytes()).hexdigest()
+
+
+def _path(name):
+    return os.path.join(model_store_dir, f"{name}.json")
+
+
+def fitter_params(fitter):
+    """The parameters needed to rebuild a fitted model with restore_fitter."""
+    return (
+        type(fitter).__name__,
+        fitter.penalizer_coef,
+        {key: float(value) for key, value in fitter.params_.items()},
+    )
+
+
+def restore_fitter(fitter_name, penalizer_coef, params):
+    """Rebuild a fitted lifetimes model from its stored parameters."""
+    fitter = FITTERS[fitter_name](penalizer_coef=penalizer_coef)
+    fitter.params_ = pd.Series(params)
+    if hasattr(fitter, "conditional_expected_number_of_purchases_up_to_time"):
+        # Set by BetaGeoFitter.fit, Gamma-Gamma CLTV calls it on the BG/NBD model
+        fitter.predict = fitter.conditional_expected_number_of_purchases_up_to_time
+    return fitter
+
+
+def save_models(name, summary_fingerprint, fitters):
+    """Write the parameters of the fitted models along with the data fingerprint."""
+    os.makedirs(model_store_dir, exist_ok=True)
+    record = {
+        "fingerprint": summary_fingerprint,
+        "fitted_at": time.time(),
+        "models": [
+            dict(zip(["fitter", "penalizer_coef", "params"], fitter_params(fitter)))
+            for fitter in fitters
+        ],
+    }
+    tmp_path = f"{_path(name)}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+    os.replace(tmp_path, _path(name))
+
+
+def load_models(name):
+    """Read stored models back as (fingerprint, fitters), or None if there are none."""
+    try:
+        with open(_path(name)) as f:
+            record = json.load(f)
+        fitters = [
+            restore_fitter(model["fitter"], model["penalizer_coef"], model["params"])
+            for model in record["models"]
+        ]
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            logger.warning("Ignoring unreadable model store entry %s: %s", name, e)
+        return None
+    return record["fingerprint"], tuple(fitters)
+
+
+def _refit(name, summary, summary_fingerprint, fit):
+    try:
+        start = time.monotonic()
+        fitters = fit(summary)
+        save_models(name, summary_fingerprint, fitters)
+        with _lock:
+            _models[name] = (summary_fingerprint, fitters)
+        logger.info("Refitted %s in %.1fs", name, time.monotonic() - start)
+    except Exception:
+        logger.exception("Background refit of %s failed", name)
+    finally:
+        with _lock:
+            _refits.pop(name, None)
+
+
+def get_models(name, summary, fit, background=True):
+    """Return fitted models for the summary, refitting only when the data changed.
+
+    fit(summary) must return a tuple of fitted lifetimes models. Models stored for
+    the same summary fingerprint are reused as is. When new transactions arrive the
+    previously stored models are returned straight away while a background thread
+    refits and stores new ones, so only the very first fit blocks the caller. With
+    background=False the refit happens in the caller instead.
+    """
+    summary_fingerprint = fingerprint(summary)
+    with _lock:
+        current = _models.get(name)
+    if current is None:
+        current = load_models(name)
+        if current is not None:
+            with _lock:
+                _models[name] = current
+    if current is not None and current[0] == summary_fingerprint:
+        return current[1]
+
+    if current is None or not background:
+        fitters = fit(summary)
+        save_models(name, summary_fingerprint, fitters)
+        with _lock:
+            _models[name] = (summary_fingerprint, fitters)
+        return fitters
+
+    with _lock:
+        if name not in _refits:
+            thread = threading.Thread(
+                target=_refit,
+                args=(name, summary, summary_fingerprint, fit),
+                daemon=True,
+            )
+            _refits[name] = thread
+            thread.start()
+    return current[1]
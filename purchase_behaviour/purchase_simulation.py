@@ -0,0 +1,55 @@
+import numpy as np
+
+# Largest customers x simulations x weeks block drawn at once, about 80 MB of float64
+MAX_CELLS = 10_000_000
+
+
+def simulate_purchases(
+    bgf, frequency, recency, T, num_weeks, simulations=1000, seed=0, max_cells=None
+):
+    """Simulated total purchases of all customers up to each of the next weeks.
+
+    Every simulation draws, per customer, whether they are still alive from the
+    BG/NBD posterior, their purchase rate from Gamma(r + x, alpha + T) and their
+    dropout probability from Beta(a, b + x). Weekly purchases are Poisson and the
+    customer drops out for good after a Geometric(p) number of further purchases.
+    Customers are processed in blocks of at most max_cells draws, so memory stays
+    bounded however many customers there are.
+
+    Returns an array of shape (simulations, num_weeks) with the cumulative total
+    over all customers, the simulated counterpart of the expected transactions
+    curve.
+    """
+    r, alpha, a, b = (bgf.params_[key] for key in ("r", "alpha", "a", "b"))
+    x = np.asarray(frequency, dtype=float)
+    recency = np.asarray(recency, dtype=float)
+    T = np.asarray(T, dtype=float)
+    rng = np.random.default_rng(seed)
+    max_cells = MAX_CELLS if max_cells is None else max_cells
+    block = max(1, max_cells // (simulations * num_weeks))
+
+    # Probability each customer is still alive at the end of their history
+    with np.errstate(divide="ignore", invalid="ignore"):
+        odds = (a / (b + x - 1)) * ((alpha + T) / (alpha + recency)) ** (r + x)
+    p_alive = 1 / (1 + np.where(x > 0, odds, 0))
+
+    totals = np.zeros((simulations, num_weeks))
+    for start in range(0, len(x), block):
+        end = min(start + block, len(x))
+        size = (simulations, end - start)
+        alive = rng.random(size) < p_alive[start:end]
+        rate = rng.gamma(r + x[start:end], 1 / (alpha + T[start:end]), size=size)
+        dropout = rng.beta(a, b + x[start:end], size=size)
+        remaining = rng.geometric(dropout)
+        weekly = rng.poisson(rate[..., None], size=size + (num_weeks,))
+        purchases = np.minimum(np.cumsum(weekly, axis=2), remaining[..., None])
+        totals += (purchases * alive[..., None]).sum(axis=1)
+    return totals
+
+
+def purchase_bands(bgf, df, num_weeks, percentiles=(5, 50, 95), **kwargs):
+    """Percentiles over simulations of the cumulative purchases, one row per percentile."""
+    simulated = simulate_purchases(
+        bgf, df["frequency"], df["recency"], df["T"], num_weeks, **kwargs
+    )
+    return np.percentile(simulated, percentiles, axis=0)
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+# Inner quintile edges of the 1-5 RFM ranks
+RFM_QUANTILES = [0.2, 0.4, 0.6, 0.8]
+RFM_COLUMNS = ["Recency", "Frequency", "Monetary"]
+
+
+class QuantileSketch:
+    """Mergeable KLL style quantile sketch of a stream of numbers.
+
+    Values are kept in levels of sorted compactors, an item on level h standing
+    for 2**h input values. A full level is sorted and every other item, starting
+    at a random offset, is promoted to the next level, so memory stays around
+    3 * k items however many values are added. Sketches of separate chunks or
+    partitions can be merged into one sketch of all of them.
+
+    error counts the worst case rank error introduced by the compactions, so
+    error_bound() is a guaranteed bound on the normalised rank error of every
+    quantile, not just an expected one.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.n = 0
+        self.error = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            level = next(
+                (
+                    h
+                    for h, items in enumerate(self.levels)
+                    if len(items) > self._capacity(h)
+                ),
+                None,
+            )
+            if level is None:
+                return
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind so the total weight is unchanged
+            held = len(items) % 2
+            offset = self._rng.integers(2)
+            self.levels[level] = items[len(items) - held :]
+            self.levels[level + 1] = np.concatenate(
+                [self.levels[level + 1], items[offset : len(items) - held : 2]]
+            )
+            self.error += 2**level
+
+    def update(self, values):
+        """Add an array of values, NaNs are skipped."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one."""
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self.error += other.error
+        self._compress()
+        return self
+
+    def quantiles(self, qs):
+        """Approximate values at the given quantiles (between 0 and 1)."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(items), 2.0**h) for h, items in enumerate(self.levels)]
+        )
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, np.asarray(qs) * cumulative[-1])
+        return values[order][np.minimum(positions, len(values) - 1)]
+
+    def error_bound(self):
+        """Worst case rank error of any quantile as a fraction of the values seen."""
+        return self.error / self.n if self.n else 0.0
+
+
+def tie_break(cust_ids):
+    """Fixed pseudo random offset in [0, 1) per customer.
+
+    Added to the integer Frequency it orders customers with the same frequency,
+    like rank(method="first") does for the exact ranks, without needing the
+    whole population.
+    """
+    hashed = np.asarray(cust_ids).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return (hashed >> np.uint64(11)) / 2.0**53
+
+
+def rfm_sketch_values(rfm):
+    """Values each RFM column is ranked on."""
+    return {
+        "Recency": rfm["Recency"],
+        "Frequency": rfm["Frequency"] + tie_break(rfm.index),
+        "Monetary": rfm["Monetary"].astype(float),
+    }
+
+
+def sketch_rfm(rfm, k=200):
+    """One sketch per RFM column for a chunk of customers."""
+    return {
+        column: QuantileSketch(k).update(values)
+        for column, values in rfm_sketch_values(rfm).items()
+    }
+
+
+def merge_rfm_sketches(sketches):
+    """Merge the per chunk sketches into one sketch per RFM column."""
+    merged = None
+    for chunk_sketches in sketches:
+        if merged is None:
+            merged = chunk_sketches
+        else:
+            for column in RFM_COLUMNS:
+                merged[column].merge(chunk_sketches[column])
+    return merged
+
+
+def rfm_ranks(rfm, edges):
+    """1-5 ranks of a chunk of customers from the merged quintile edges.
+
+    Bins are right closed like pd.qcut, and recent customers get the high
+    Recency ranks.
+    """
+    values = rfm_sketch_values(rfm)
+    ranks = {
+        column: np.searchsorted(edges[column], values[column], side="left") + 1
+        for column in RFM_COLUMNS
+    }
+    return pd.DataFrame(
+        {
+            "Recency_rank": 6 - ranks["Recency"],
+            "Frequency_rank": ranks["Frequency"],
+            "Monetary_rank": ranks["Monetary"],
+        },
+        index=rfm.index,
+    )
@@ -1,9 +1,8 @@
 import pandas as pd
-import psycopg2
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 import streamlit as st
-from h2ogpte import H2OGPTE
 
 # Explicitly specify the path to the .env file
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
@@ -12,21 +11,27 @@ h2o_api = os.getenv("H2O_API_KEY_CHATBOT")
 h20_collection_id = os.getenv("H2O_PRODUCTS_COLLECTION_ID")
 
 
-# Initialize the H2OGPTE client
-client = H2OGPTE(
-    address="https://h2ogpte.genai.h2o.ai",
-    api_key=h2o_api,
-)
-
 collection_id = h20_collection_id
 
 
+@lru_cache(maxsize=1)
+def get_client():
+    """Initialize the H2OGPTE client on first use."""
+    from h2ogpte import H2OGPTE
+
+    return H2OGPTE(
+        address="https://h2ogpte.genai.h2o.ai",
+        api_key=h2o_api,
+    )
+
+
 def display_ai_chatbot_tab(tab):
     """Displays the AI Chatbot content within the specified Streamlit tab."""
     with tab:
         st.title("RAGccoBot🤖")
 
         # Initialize chat session
+        client = get_client()
         chat_session_id = client.create_chat_session(collection_id)
 
         # Initialize chat history
@@ -59,6 +64,7 @@ def display_ai_chatbot_tab(tab):
 
 
 def get_recommendation(chat_session_id, user_input):
+    client = get_client()
 
     if not chat_session_id:
         chat_session_id = client.create_chat_session(collection_id)
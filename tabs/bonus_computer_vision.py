@@ -4,30 +4,10 @@ import pandas as pd
 import numpy as np
 import pickle
 import os
-import psycopg2
+from functools import lru_cache
 from io import StringIO
 from PIL import Image
-from tensorflow.keras.models import Model, model_from_json, load_model
-from tensorflow.keras.optimizers import Adam
-from tensorflow.keras.applications.vgg16 import VGG16, preprocess_input
-from sklearn.neighbors import NearestNeighbors
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
+from tabs.db import get_db_connection
 
 
 def load_df():
@@ -39,7 +19,11 @@ def load_df():
     return df
 
 
+# TensorFlow is only imported, and the models only loaded, on first use
+@lru_cache(maxsize=1)
 def load_product_categorisation_model():
+    from tensorflow.keras.models import model_from_json
+    from tensorflow.keras.optimizers import Adam
 
     # load cnn model
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -81,7 +65,11 @@ def predict_product_category(loaded_model, img_bytes):
     return cat
 
 
-def search_similar_products(img_bytes, k=5):
+@lru_cache(maxsize=1)
+def load_similar_products_models():
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.applications.vgg16 import VGG16
+
     df = pd.read_csv("computer_vision/amazon_embeddings.csv")
     # df = load_df()
     # load KNN model
@@ -90,6 +78,13 @@ def search_similar_products(img_bytes, k=5):
     # load embedding model
     base_model = VGG16(weights="imagenet", include_top=False)
     embedding_model = Model(inputs=base_model.input, outputs=base_model.output)
+    return df, knn_model, embedding_model
+
+
+def search_similar_products(img_bytes, k=5):
+    from tensorflow.keras.applications.vgg16 import preprocess_input
+
+    df, knn_model, embedding_model = load_similar_products_models()
 
     # load input image and generate embedding
 
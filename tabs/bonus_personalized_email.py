@@ -1,45 +1,36 @@
 import pandas as pd
 import os
-import nltk
 import numpy as np
-from h2ogpte import H2OGPTE
+from functools import lru_cache
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import linear_kernel
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from IPython.display import Markdown
 import streamlit as st
+from tabs.db import read_sql
 
 
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
 
 #### Load environment variables ####
 h2o_api_key = os.getenv("H2O_API_KEY_EMAIL")
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-# Download NLTK resources
-nltk.download("stopwords")
-
-#### Connect to PostgreSQL database and load relevant table ####
-engine = create_engine(
-    f"postgresql://{user}:{postgres_password}@{host}:{postgres_port_no}/{database}"
-)
-online_sales = pd.read_sql("SELECT * FROM online_sales", engine)
-products = pd.read_sql("SELECT * FROM products", engine)
-users = pd.read_sql("SELECT * FROM users", engine)
-products.drop(["discounted_price", "discount_percentage"], axis=1, inplace=True)
-df = pd.merge(online_sales, products, on="product_id", how="left")
+
+
+#### Load relevant tables through the shared connection pool ####
+# Deferred until the first email is generated so importing this module stays cheap
+@lru_cache(maxsize=1)
+def load_data():
+    online_sales = read_sql("SELECT * FROM online_sales")
+    products = read_sql("SELECT * FROM products")
+    users = read_sql("SELECT * FROM users")
+    products.drop(["discounted_price", "discount_percentage"], axis=1, inplace=True)
+    df = pd.merge(online_sales, products, on="product_id", how="left")
+    return online_sales, products, users, df
 
 
 ##### Product Recommendations #####
 def user_based_recommendation(cust_id, df, top_n=3):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    _, products, _, _ = load_data()
+
     # Check if the cust_id exists in the DataFrame
     if cust_id not in df["cust_id"].unique():
         print(f"User ID {cust_id} not found in the dataset.")
@@ -111,10 +102,20 @@ def user_based_recommendation(cust_id, df, top_n=3):
     return recommended_products, recommended_product_names
 
 
+@lru_cache(maxsize=1)
+def load_text_tools():
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.stem import PorterStemmer
+
+    # Download NLTK resources
+    nltk.download("stopwords")
+    return set(stopwords.words("english")), PorterStemmer()
+
+
 # Define a function to preprocess text
 def preprocess_text(text):
-    stop_words = set(stopwords.words("english"))
-    stemmer = PorterStemmer()
+    stop_words, stemmer = load_text_tools()
 
     # Tokenize, remove stop words, and apply stemming
     tokens = text.split()
@@ -124,6 +125,9 @@ def preprocess_text(text):
 
 
 def content_based_recommendation(cust_id, transactions_df, products_df, top_n=3):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import linear_kernel
+
     # Check if the cust_id exists in the transactions DataFrame
     if cust_id not in transactions_df["cust_id"].unique():
         print(f"User ID {cust_id} not found in the dataset.")
@@ -362,9 +366,16 @@ def overall_recommendation(cust_id, transactions_df, products_df, top_n=3):
 
 #### Connect to H2O.ai's GPTE API ####
 h2o_endpoint = "https://h2ogpte.genai.h2o.ai"
-client = H2OGPTE(  # Initialize the H2OGPTE client
-    address=h2o_endpoint, api_key=h2o_api_key
-)
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    from h2ogpte import H2OGPTE
+
+    return H2OGPTE(  # Initialize the H2OGPTE client
+        address=h2o_endpoint, api_key=h2o_api_key
+    )
+
 
 #### Generate personalized email content using H2O.ai's GPTE ####
 
@@ -375,6 +386,7 @@ def summarize_description(description):
         f"Summarize the following product description in one line:\n\n{description}"
     )
     attempts = 3  # Number of retry attempts
+    client = get_client()
 
     for _ in range(attempts):
         chat_session_id = client.create_chat_session()
@@ -464,6 +476,8 @@ def create_email_prompt(user_id, user_info, recommendations):
 
 
 def generate_personalized_email_h2o(user_id):
+    online_sales, products, users, df = load_data()
+
     # Retrieve user demographics
     user_info = users[users["user_id"] == user_id].iloc[0].to_dict()
 
@@ -521,6 +535,7 @@ def generate_personalized_email_h2o(user_id):
     prompt = create_email_prompt(user_id, user_info, formatted_recs)
 
     # Start a chat session and send the prompt
+    client = get_client()
     chat_session_id = client.create_chat_session()
     with client.connect(chat_session_id) as session:
         reply = session.query(prompt, timeout=60)
@@ -542,6 +557,7 @@ def display_personalized_email_tab(tab):
     )
 
     # Display user selection dropdown
+    online_sales, _, _, _ = load_data()
     user_id = tab.selectbox(
         "Select User ID:", online_sales["cust_id"].unique().tolist()
     )
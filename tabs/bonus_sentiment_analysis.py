@@ -1,10 +1,13 @@
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-import nltk
-
-nltk.download("vader_lexicon")
+from functools import lru_cache
 
 
+@lru_cache(maxsize=1)
 def load_vader():
+    # nltk and the lexicon download are deferred until the analyzer is first needed
+    import nltk
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    nltk.download("vader_lexicon")
     analyzer = SentimentIntensityAnalyzer()
     return analyzer
 
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+CUBE_KEYS = ["date", "marketing_channel", "coupon_code", "coupon_status"]
+# Columns kept as a sum and a count of non-missing values, so any mean over a
+# set of cells is sum / count
+MEASURES = [
+    "quantity",
+    "revenue",
+    "Is_First_Purchase",
+    "ROI",
+    "ROI_adjusted",
+    "ROI_seasonal_adjusted",
+]
+
+# Promotional campaign charts: name -> (value column, title, value from a summary)
+CHART_TYPES = {
+    "Total quantity sold": (
+        "quantity",
+        "Total Quantity Sold",
+        lambda s: s["quantity_sum"],
+    ),
+    "Average quantity sold per transaction": (
+        "quantity",
+        "Average Quantity Sold per Transaction",
+        lambda s: s["quantity_sum"] / s["quantity_count"],
+    ),
+    "Total revenue": ("revenue", "Total Revenue", lambda s: s["revenue_sum"]),
+    "Average revenue per transaction": (
+        "revenue",
+        "Average Revenue per Transaction",
+        lambda s: s["revenue_sum"] / s["revenue_count"],
+    ),
+    "Total transactions": (
+        "transaction_id",
+        "Total Transactions",
+        lambda s: s["transactions"],
+    ),
+    "Repeat purchase rate": (
+        "Is_First_Purchase",
+        "Repeat Purchase Rate",
+        lambda s: 1 - s["Is_First_Purchase_sum"] / s["Is_First_Purchase_count"],
+    ),
+    "Product variety per transaction": (
+        "product_id",
+        "Product Variety per Transaction",
+        lambda s: s["products"],
+    ),
+    "New customer rate": (
+        "Is_First_Purchase",
+        "New Customer Rate",
+        lambda s: s["Is_First_Purchase_sum"] / s["Is_First_Purchase_count"],
+    ),
+    "Average adjusted ROI": (
+        "ROI_adjusted",
+        "Average Adjusted ROI",
+        lambda s: s["ROI_adjusted_sum"] / s["ROI_adjusted_count"],
+    ),
+}
+
+
+def _additive(df, keys):
+    # Rows with a missing key keep their own cell, roll-ups on other keys need them
+    grouped = df.groupby(keys, observed=True, dropna=False)
+    sums = grouped[MEASURES].sum().add_suffix("_sum")
+    counts = grouped[MEASURES].count().add_suffix("_count")
+    return pd.concat([sums, counts], axis=1)
+
+
+def _rollup(cube, keys):
+    # Cells missing one of these keys drop out, like in a groupby on the sales
+    columns = [f"{m}_sum" for m in MEASURES] + [f"{m}_count" for m in MEASURES]
+    return cube.groupby(keys, observed=True)[columns].sum()
+
+
+def build_channel_cube(sales_data):
+    """Aggregate the marketing channel sales once for every tab3a chart.
+
+    The sales are summed into cells of (date, marketing_channel, coupon_code,
+    coupon_status) holding the sum and count of every measure, and the cells are
+    rolled up into a tuple of:
+    - one row per marketing channel, for the ROI by channel chart
+    - one row per (date, marketing_channel), for the seasonal ROI chart
+    - summaries per coupon_status and per (coupon_code, coupon_status), for the
+      promotional campaign charts
+
+    Distinct transactions and products are not additive across cells, so the two
+    summaries count them on the sales themselves.
+    """
+    cube = _additive(sales_data, CUBE_KEYS)
+
+    summaries = []
+    for keys in (["coupon_status"], ["coupon_code", "coupon_status"]):
+        summary = _rollup(cube, keys)
+        distinct = sales_data.groupby(keys, observed=True).agg(
+            transactions=("transaction_id", "nunique"),
+            products=("product_id", "nunique"),
+        )
+        summaries.append(summary.join(distinct).reset_index())
+
+    # Channels in order of first appearance, like the unique() of the sales
+    channels = sales_data["marketing_channel"].dropna().unique()
+    return (
+        _rollup(cube, ["marketing_channel"]).reindex(channels).reset_index(),
+        _rollup(cube, ["date", "marketing_channel"]).reset_index(),
+        *summaries,
+    )
+
+
+def mean_by(rollup, keys, measure):
+    """Mean of a measure over the rows of a roll-up, grouped by keys."""
+    grouped = rollup.groupby(keys, observed=True)[
+        [f"{measure}_sum", f"{measure}_count"]
+    ].sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = grouped[f"{measure}_sum"] / grouped[f"{measure}_count"]
+    return means.rename(measure).reset_index()
+
+
+def chart_data(summary, chart_type, keys):
+    """Values of a promotional campaign chart, read from a summary."""
+    y_axis, title, value = CHART_TYPES[chart_type]
+    data = summary[keys].copy()
+    data[y_axis] = value(summary)
+    return data, y_axis, title
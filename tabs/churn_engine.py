@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Period lengths the churn tab can be switched between
+PERIODS = {"Quarterly": "Q", "Monthly": "M", "Weekly": "W"}
+
+# Set bits of every byte value, popcount of packed bitmaps by table lookup
+_BITS = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def encode_activity(users, dates, freq="Q", values=None):
+    """Integer customer codes and period ordinals of every purchase.
+
+    Rows without a customer or a date are dropped. Returns the codes, the
+    ordinals, the values of the kept rows (or None) and the PeriodIndex of all
+    periods from the first to the last purchase.
+    """
+    codes, _ = pd.factorize(pd.Series(users), sort=False)
+    periods = pd.PeriodIndex(pd.to_datetime(pd.Series(dates)), freq=freq)
+    valid = (codes >= 0) & ~periods.isna()
+    codes, ordinals = codes[valid], periods.asi8[valid]
+    if values is not None:
+        values = np.asarray(values, dtype=float)[valid]
+    index = pd.period_range(
+        pd.Period(ordinal=ordinals.min(), freq=periods.freq),
+        pd.Period(ordinal=ordinals.max(), freq=periods.freq),
+    )
+    return codes, ordinals, values, index
+
+
+def activity_bitmaps(users, dates, freq="Q"):
+    """Pack who bought in which period into one bitmap of customers per period.
+
+    Customers are encoded as integer codes and bit code of row p is set when the
+    customer bought in the p-th period. Every period between the first and the
+    last purchase gets a row, so periods without sales are empty rather than
+    skipped. Returns the (periods, ceil(customers / 8)) uint8 bitmaps and the
+    PeriodIndex of their rows.
+    """
+    codes, ordinals, _, index = encode_activity(users, dates, freq)
+    first = index[0].ordinal
+    n_bytes = (codes.max() + 8) // 8
+
+    # OR the bit of every purchase into the byte of its customer and period
+    keys = (ordinals - first) * n_bytes + (codes >> 3)
+    bits = np.uint8(128) >> (codes & 7).astype(np.uint8)
+    bitmaps = np.zeros(len(index) * n_bytes, dtype=np.uint8)
+    np.bitwise_or.at(bitmaps, keys, bits)
+    return bitmaps.reshape(len(index), n_bytes), index
+
+
+def _count(bitmaps):
+    # Customers set in each row
+    return _BITS[bitmaps].sum(axis=1, dtype=np.int64)
+
+
+def churn_metrics(users, dates, freq="Q"):
+    """Churn, retention and reactivation of every period against the one before.
+
+    churned customers bought in the previous period but not in this one,
+    retained customers in both, reactivated customers in this one and some
+    earlier period but not the previous one. Rates of churn and retention are
+    shares of the previous period's customers, the reactivation rate is a share
+    of this period's customers. All periods are compared at once with bitwise
+    operations on the packed bitmaps.
+    """
+    bitmaps, index = activity_bitmaps(users, dates, freq)
+    previous, current = bitmaps[:-1], bitmaps[1:]
+    # Customers seen in any period up to and including the previous one
+    seen = np.bitwise_or.accumulate(bitmaps, axis=0)[:-1]
+
+    active_before = _count(previous)
+    active = _count(current)
+    retained = _count(previous & current)
+    reactivated = _count(current & ~previous & seen)
+    churned = active_before - retained
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics = pd.DataFrame(
+            {
+                "period": index[1:].astype(str),
+                "active": active,
+                "retained": retained,
+                "churned": churned,
+                "reactivated": reactivated,
+                "new": active - retained - reactivated,
+                "churn_rate": churned / active_before,
+                "retention_rate": retained / active_before,
+                "reactivation_rate": reactivated / active,
+            }
+        )
+    return metrics
+
+
+def cohort_matrices(users, dates, revenue, freq="Q"):
+    """Retention and revenue of every acquisition cohort by periods since acquisition.
+
+    A customer's cohort is the period of their first purchase. Row c, column k of
+    the retention matrix is the share of cohort c that bought again k periods
+    after acquiring, the revenue matrix holds what the cohort spent in that
+    period. Everything is counted with bincount over flat (cohort, age) cells in
+    one pass over the purchases, and cells past the last period are NaN.
+    Returns the retention and revenue frames and the cohort sizes.
+    """
+    codes, ordinals, revenue, index = encode_activity(users, dates, freq, revenue)
+    first = index[0].ordinal
+    n_periods = len(index)
+
+    # First purchase period of every customer, as an offset into the index
+    cohort = np.full(codes.max() + 1, n_periods, dtype=np.int64)
+    np.minimum.at(cohort, codes, ordinals - first)
+    row_cohort = cohort[codes]
+    cells = row_cohort * n_periods + (ordinals - first - row_cohort)
+    size = n_periods * n_periods
+
+    revenue_cells = np.bincount(cells, weights=revenue, minlength=size)
+    # Each customer counts once per cell however often they bought in it
+    customer_cells = pd.unique(cells * (codes.max() + 1) + codes)
+    active_cells = np.bincount(customer_cells // (codes.max() + 1), minlength=size)
+
+    active = active_cells.reshape(n_periods, n_periods).astype(float)
+    revenue = revenue_cells.reshape(n_periods, n_periods)
+    sizes = active[:, 0].copy()
+    # Cohort c is only observed for the n_periods - c periods after acquiring
+    observed = np.add.outer(np.arange(n_periods), np.arange(n_periods)) < n_periods
+    with np.errstate(divide="ignore", invalid="ignore"):
+        retention = np.where(observed, active / sizes[:, None], np.nan)
+    revenue = np.where(observed, revenue, np.nan)
+
+    labels = index.astype(str)
+    has_customers = sizes > 0
+    ages = pd.RangeIndex(n_periods, name="periods_since_acquisition")
+    cohorts = pd.Index(labels[has_customers], name="cohort")
+    return (
+        pd.DataFrame(retention[has_customers], index=cohorts, columns=ages),
+        pd.DataFrame(revenue[has_customers], index=cohorts, columns=ages),
+        pd.Series(
+            sizes[has_customers].astype(np.int64), index=cohorts, name="customers"
+        ),
+    )
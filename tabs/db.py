@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+from dotenv import load_dotenv
+
+# Explicitly specify the path to the .env file
+load_dotenv(os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+postgres_password = os.getenv("POSTGRES_PASSWORD")
+postgres_port_no = os.getenv("POSTGRES_PORT")
+host = os.getenv("POSTGRES_HOST")
+database = os.getenv("POSTGRES_DB")
+user = os.getenv("POSTGRES_USER")
+
+# Pool sizing, can be tuned from the .env file
+pool_min_size = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+pool_max_size = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+pool_timeout = float(os.getenv("POSTGRES_POOL_TIMEOUT", "30"))
+pool_max_idle = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300"))
+pool_health_check_interval = float(os.getenv("POSTGRES_POOL_HEALTH_CHECK", "30"))
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are handed out LIFO so that the least recently used ones age out
+    and get recycled once they have been idle for longer than ``max_idle`` seconds.
+    A connection that has been idle for longer than ``health_check_interval`` is
+    pinged with ``SELECT 1`` before it is handed out again.
+    """
+
+    def __init__(
+        self,
+        min_size=1,
+        max_size=10,
+        timeout=30.0,
+        max_idle=300.0,
+        health_check_interval=30.0,
+        **connect_kwargs,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []  # list of (connection, last_used) pairs
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "connections_created": 0,
+            "connections_closed": 0,
+            "failed_health_checks": 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats["failed_health_checks"] += 1
+            return False
+
+    def _recycle_idle(self):
+        """Close connections idle for longer than max_idle, keeping min_size around."""
+        now = time.monotonic()
+        # The oldest connections sit at the start of the list
+        while self._idle and self._size > self.min_size:
+            conn, last_used = self._idle[0]
+            if now - last_used <= self.max_idle:
+                break
+            self._idle.pop(0)
+            self._discard(conn)
+            self._size -= 1
+
+    def _reserve(self, deadline):
+        """Pop an idle connection or reserve a slot for a new one (conn is None)."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                self._recycle_idle()
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"no connection available within {self.timeout:.1f}s "
+                        f"(max_size={self.max_size})"
+                    )
+                self._cond.wait(remaining)
+
+    def getconn(self):
+        """Check a connection out of the pool, waiting up to the pool timeout."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            conn, last_used = self._reserve(deadline)
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                break
+            # Health checks run outside of the lock so they never block other threads
+            if self._is_healthy(conn, last_used):
+                break
+            with self._cond:
+                self._discard(conn)
+                self._size -= 1
+                self._cond.notify()
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, closing it if it is no longer usable."""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that commits on success and rolls back on error."""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            discard = conn.closed != 0
+            if not discard:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            self.putconn(conn, discard=discard)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+                self._size -= 1
+            self._idle = []
+            self._cond.notify_all()
+
+    def metrics(self):
+        """Return a snapshot of the pool counters, useful for sizing the pool."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+            stats["min_size"] = self.min_size
+            stats["max_size"] = self.max_size
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = (
+            stats["wait_time_total"] / checkouts if checkouts else 0.0
+        )
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_pid
+    # A pool inherited through fork shares sockets with the parent, never reuse it
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                min_size=pool_min_size,
+                max_size=pool_max_size,
+                timeout=pool_timeout,
+                max_idle=pool_max_idle,
+                health_check_interval=pool_health_check_interval,
+                host=host,
+                database=database,
+                user=user,
+                password=postgres_password,
+                port=postgres_port_no,
+            )
+            _pool_pid = os.getpid()
+    return _pool
+
+
+@contextmanager
+def get_db_connection():
+    """Get a pooled database connection."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def read_sql(query, params=None):
+    """Run a query on a pooled connection and return the result as a DataFrame."""
+    with get_db_connection() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+def pool_metrics():
+    """Return checkout, wait time and in-use counters of the shared pool."""
+    return get_pool().metrics()
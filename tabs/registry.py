@@ -0,0 +1,187 @@
+import functools
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from tabs.snapshot import change_token
+
+logger = logging.getLogger(__name__)
+
+# Seconds a loaded dataset is kept before it is loaded again, even if unchanged
+dataset_ttl = float(os.getenv("DATASET_TTL", "3600"))
+# Seconds a data version is served before it is checked again, in the background
+version_ttl = float(os.getenv("DATASET_VERSION_TTL", "5"))
+
+# Shared frames are handed out as shallow copies, copy-on-write keeps an
+# in-place write in one session from reaching the copy the others read
+pd.options.mode.copy_on_write = True
+
+_missing = object()  # marks a dataset that is not cached, loaders may return None
+_entries = {}  # dataset name -> (version, loaded_at, value)
+_versions = {}  # (tables, files) -> (version or error, checked_at)
+_checking = set()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "load_time_total": 0.0}
+_guard = threading.Lock()
+_locks = {}
+_reported = set()
+
+
+def _lock_for(name):
+    with _guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _check_version(key):
+    tables, files = key
+    try:
+        parts = [change_token(table) for table in tables]
+        # A missing file is left for the loader itself to report
+        parts += [
+            str(os.path.getmtime(path)) if os.path.exists(path) else "missing"
+            for path in files
+        ]
+        result = "/".join(parts)
+    except Exception as e:
+        result = e
+    with _guard:
+        _versions[key] = (result, time.monotonic())
+        _checking.discard(key)
+    return result
+
+
+def data_version(tables=(), files=()):
+    """Version of the data behind a loader, from table change tokens and file mtimes.
+
+    Only the first call for some tables and files waits for the check. Later
+    calls return the last known version and, once it is older than version_ttl,
+    check again in a background thread, so hot paths never wait on the database.
+    """
+    key = (tuple(tables), tuple(files))
+    with _guard:
+        cached = _versions.get(key)
+        refresh = (
+            cached is not None
+            and key not in _checking
+            and time.monotonic() - cached[1] >= version_ttl
+        )
+        if refresh:
+            _checking.add(key)
+    if refresh:
+        threading.Thread(target=_check_version, args=(key,), daemon=True).start()
+    result = _check_version(key) if cached is None else cached[0]
+    if isinstance(result, Exception):
+        # Raised again until the next check, without growing its traceback
+        raise result.with_traceback(None)
+    return result
+
+
+def _share(value):
+    """Hand out shallow copies so sessions can add or drop columns independently."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    if isinstance(value, tuple):
+        return tuple(_share(item) for item in value)
+    return value
+
+
+def _evict(name):
+    if _entries.pop(name, None) is not None:
+        _stats["evictions"] += 1
+
+
+def get(name, loader, version="", ttl=None):
+    """Return the dataset registered under name, loading it once per version and TTL.
+
+    Concurrent callers asking for the same missing dataset wait for a single load
+    instead of each running the loader.
+    """
+    ttl = dataset_ttl if ttl is None else ttl
+
+    def lookup():
+        entry = _entries.get(name)
+        if entry is None:
+            return _missing
+        if entry[0] != version or time.monotonic() - entry[1] > ttl:
+            _evict(name)
+            return _missing
+        _stats["hits"] += 1
+        return entry[2]
+
+    with _guard:
+        value = lookup()
+    if value is not _missing:
+        return _share(value)
+
+    with _lock_for(name):
+        with _guard:
+            value = lookup()
+            if value is _missing:
+                _stats["misses"] += 1
+        if value is _missing:
+            start = time.monotonic()
+            value = loader()
+            elapsed = time.monotonic() - start
+            with _guard:
+                _entries[name] = (version, time.monotonic(), value)
+                _stats["load_time_total"] += elapsed
+    return _share(value)
+
+
+def dataset(name, tables=(), files=(), ttl=None):
+    """Decorator sharing the result of an argument-free loader across all sessions.
+
+    The dataset is keyed by name and by the version of the given database tables
+    and files, so it is reloaded as soon as any of them changes.
+    """
+
+    def decorator(loader):
+        @functools.wraps(loader)
+        def wrapper():
+            try:
+                version = data_version(tables, files)
+            except Exception as e:
+                # Keep serving the loaded copy if the database cannot be reached
+                entry = _entries.get(name)
+                if entry is None:
+                    raise
+                report_once(f"Serving {name} without a version check:", e)
+                version = entry[0]
+            return get(name, loader, version=version, ttl=ttl)
+
+        return wrapper
+
+    return decorator
+
+
+def report_once(message, error):
+    """Log an error the first time it is seen, not on every render that hits it."""
+    key = (message, str(error))
+    with _guard:
+        if key in _reported:
+            return
+        _reported.add(key)
+    logger.warning("%s %s", message, error)
+
+
+def invalidate(name=None):
+    """Drop one dataset, or every dataset, so the next call loads it again."""
+    with _guard:
+        for key in [name] if name is not None else list(_entries):
+            _evict(key)
+
+
+def registry_stats():
+    """Return the hit, miss and eviction counters and the datasets currently held."""
+    with _guard:
+        stats = dict(_stats)
+        now = time.monotonic()
+        stats["datasets"] = {
+            name: {"version": version, "age": now - loaded_at}
+            for name, (version, loaded_at, _) in _entries.items()
+        }
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
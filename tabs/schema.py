@@ -0,0 +1,179 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# Compact dtypes for every frame the dashboards load, keyed by table or snapshot name.
+# Low cardinality strings become categoricals, numerics are narrowed to 32 bits and
+# dates are parsed once on load. Money totals stay float64 so sums do not drift.
+TABLE_DTYPES = {
+    "online_sales": {
+        "cust_id": "int32",
+        "transaction_id": "int32",
+        "date": "datetime",
+        "product_id": "category",
+        "coupon_status": "category",
+        "coupon_code": "category",
+        "discount_percentage": "float32",
+        "delivery_charges": "float32",
+        "quantity": "int32",
+    },
+    "products": {
+        "category": "category",
+        "actual_price": "float32",
+        "discounted_price": "float32",
+        "discount_percentage": "float32",
+        "origin_area": "category",
+    },
+    "users": {
+        "user_id": "int32",
+        "age": "int32",
+        "gender": "category",
+    },
+    "ratings": {
+        "average_rating": "float32",
+        "rating_count": "int32",
+    },
+    "shipping_status": {
+        "user_id": "int32",
+        "transaction_id": "int32",
+        "date": "datetime",
+        "shipping_id": "int32",
+        "status": "category",
+        "fulfilment": "category",
+        "ship_service_level": "category",
+        "estimated_delivery_date": "datetime",
+        "fulfilled_by": "category",
+    },
+    "shipping_history": {
+        "date": "datetime",
+        "shipping_id": "int32",
+        "status": "category",
+        "ship_service_level": "category",
+        "update_date": "datetime",
+    },
+    "sales_enriched": {
+        "cust_id": "int32",
+        "transaction_id": "int32",
+        "date": "datetime",
+        "product_id": "category",
+        "coupon_status": "category",
+        "coupon_code": "category",
+        "discount_percentage": "float32",
+        "quantity": "int32",
+        "category": "category",
+        "actual_price": "float32",
+        "age": "int32",
+        "gender": "category",
+        "total_price": "float64",
+    },
+    # purchase_behaviour/batch_scoring.py
+    "customer_scores": {
+        "cust_id": "int32",
+        "recency_days": "int32",
+        "frequency": "int32",
+        "monetary": "float64",
+        "rfm_score": "int32",
+        "rfm_segment": "category",
+        "expected_purchases": "float32",
+        "expected_average_profit": "float32",
+        "clv": "float64",
+        "clv_segment": "category",
+        "model_fingerprint": "category",
+        "scored_at": "datetime",
+    },
+    # data/db_init.py
+    "customer_summary": {
+        "cust_id": "int32",
+        "first_date": "datetime",
+        "last_date": "datetime",
+        "transactions": "int32",
+        "orders": "int32",
+        "revenue": "float64",
+        "unique_products": "int32",
+        "updated_at": "datetime",
+    },
+    # tabs/tab1b.py load_data
+    "actual_sales": {
+        "date": "datetime",
+        "product_id": "category",
+        "sales": "int32",
+    },
+    # tabs/tab3b.py load_data_tab3
+    "shipping_history_status": {
+        "shipping_id": "int32",
+        "fulfilment": "category",
+        "ship_service_level": "category",
+        "estimated_delivery_date": "datetime",
+        "fulfilled_by": "category",
+        "status": "category",
+        "update_date": "datetime",
+    },
+    # tabs/tab3a.py load_data_wy
+    "marketing_channels": {
+        "transaction_id": "int32",
+        "date": "datetime",
+        "product_id": "category",
+        "marketing_channel": "category",
+        "coupon_code": "category",
+        "coupon_status": "category",
+        "quantity": "int32",
+        "revenue": "float64",
+        "Is_First_Purchase": "float32",
+        "ROI": "float32",
+        "ROI_adjusted": "float32",
+        "ROI_seasonal_adjusted": "float32",
+    },
+}
+
+_memory_log = {}
+
+
+def schema_version(name):
+    """Fingerprint of the dtypes registered for a frame, changes when they are edited."""
+    dtypes = json.dumps(TABLE_DTYPES.get(name, {}), sort_keys=True)
+    return hashlib.sha1(dtypes.encode()).hexdigest()[:12]
+
+
+def _convert(series, dtype):
+    if dtype == "datetime":
+        return pd.to_datetime(series, errors="coerce")
+    if dtype == "category":
+        return series.astype("category")
+    numbers = pd.to_numeric(series, errors="coerce")
+    if dtype.startswith("int"):
+        limits = np.iinfo(dtype)
+        if numbers.min() < limits.min or numbers.max() > limits.max:
+            # Ids outgrowing the registered width keep 64 bits instead of wrapping
+            dtype = "int64"
+        if numbers.isna().any():
+            # Plain integer dtypes cannot hold missing values, the nullable ones can
+            dtype = dtype.capitalize()
+    return numbers.astype(dtype)
+
+
+def apply_schema(df, name):
+    """Convert the columns of a frame to the compact dtypes registered under name."""
+    dtypes = TABLE_DTYPES.get(name)
+    if not dtypes:
+        return df
+    before = df.memory_usage(deep=True).sum()
+    df = df.copy(deep=False)
+    for column, dtype in dtypes.items():
+        if column in df.columns:
+            df[column] = _convert(df[column], dtype)
+    _memory_log[name] = {
+        "rows": len(df),
+        "before_mb": before / 1e6,
+        "after_mb": df.memory_usage(deep=True).sum() / 1e6,
+    }
+    return df
+
+
+def memory_report():
+    """Return the memory of every converted frame before and after apply_schema."""
+    report = pd.DataFrame.from_dict(_memory_log, orient="index")
+    if not report.empty:
+        report["reduction"] = report["before_mb"] / report["after_mb"]
+    return report
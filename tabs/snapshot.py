@@ -0,0 +1,191 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from tabs.db import get_db_connection, read_sql
+from tabs.schema import apply_schema, schema_version
+
+logger = logging.getLogger(__name__)
+
+# Local snapshots live next to the project unless SNAPSHOT_DIR says otherwise
+snapshot_dir = os.getenv(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(__file__), "..", ".cache", "snapshots"),
+)
+# Seconds a change token is trusted before the database is asked again
+token_ttl = float(os.getenv("SNAPSHOT_TOKEN_TTL", "5"))
+
+# Every session is handed a view of the same snapshot. With copy-on-write an
+# in-place write (df.loc[...] = ...) copies the columns it touches first, so
+# it never changes the frame the other sessions read.
+pd.options.mode.copy_on_write = True
+
+# Date column used to detect appended rows, on top of the row count
+change_columns = {
+    "online_sales": "date",
+    "shipping_status": "date",
+    "shipping_history": "update_date",
+    "sales_enriched": "date",
+    "customer_summary": "updated_at",
+    "customer_scores": "scored_at",
+}
+
+# Activity counters of the table and of all its partitions, plus their file
+# nodes, which TRUNCATE and a plain REFRESH MATERIALIZED VIEW replace
+CHANGE_QUERY = """
+SELECT
+    coalesce(sum(s.n_tup_ins), 0),
+    coalesce(sum(s.n_tup_upd), 0),
+    coalesce(sum(s.n_tup_del), 0),
+    string_agg(pg_relation_filenode(c.oid)::text, ',' ORDER BY c.oid)
+FROM pg_class AS c
+LEFT JOIN pg_stat_user_tables AS s ON s.relid = c.oid
+WHERE c.oid = %(table)s::regclass
+    OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %(table)s::regclass)
+"""
+
+_frames = {}  # snapshot name -> (token, DataFrame)
+_tokens = {}  # table name -> (token, checked_at)
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def change_token(table_name):
+    """Return a token that changes whenever rows of the table change.
+
+    Combines the row count and, for fact tables, the latest date with the
+    insert, update and delete counters of the statistics collector. The
+    counters catch updates and deletes that leave the count unchanged, the
+    data itself keeps a token from matching an older one after the counters
+    were reset by pg_stat_reset or a crash. Counters are published up to
+    about ten seconds after a commit, so an update that changes neither the
+    count nor the latest date can take that much longer than the TTL to show up.
+    """
+    cached = _tokens.get(table_name)
+    if cached is not None and time.monotonic() - cached[1] < token_ttl:
+        return cached[0]
+
+    date_column = change_columns.get(table_name)
+    max_date = f", max({date_column})::text" if date_column else ""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT count(*){max_date} FROM {table_name}")
+            row = cur.fetchone()
+            cur.execute(CHANGE_QUERY, {"table": table_name})
+            row += cur.fetchone()
+    token = "|".join(str(value) for value in row)
+    _tokens[table_name] = (token, time.monotonic())
+    return token
+
+
+def _path(name):
+    return os.path.join(snapshot_dir, f"{name}.arrow")
+
+
+def _read_snapshot(name, token):
+    """Memory-map the Arrow file of a snapshot if it was written for this token."""
+    try:
+        with pa.memory_map(_path(name), "r") as source:
+            reader = pa.ipc.open_file(source)
+            # The token travels in the file itself, so data and token always match
+            meta = reader.schema.metadata or {}
+            if (
+                meta.get(b"token") != token.encode()
+                or meta.get(b"schema") != schema_version(name).encode()
+            ):
+                return None
+            table = reader.read_all()
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return None
+    return table.to_pandas(split_blocks=True)
+
+
+def _write_snapshot(name, token, df):
+    """Write the frame as an uncompressed Arrow IPC file so it can be memory-mapped."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    data_path = _path(name)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            "token": token,
+            "schema": schema_version(name),
+            "written_at": str(time.time()),
+        }
+    )
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # A single rename, readers see either the old or the new file as a whole
+    os.replace(tmp_path, data_path)
+
+
+def _load(name, query, tables):
+    try:
+        tokens = [change_token(table) for table in tables]
+    except Exception as e:
+        # Serve the last snapshot we have if the database cannot be reached
+        cached = _frames.get(name)
+        if cached is None:
+            raise
+        logger.warning("Serving stale snapshot of %s: %s", name, e)
+        return cached[1]
+    token = hashlib.sha1("/".join(tokens).encode()).hexdigest()
+
+    cached = _frames.get(name)
+    if cached is not None and cached[0] == token:
+        return cached[1]
+
+    with _lock_for(name):
+        cached = _frames.get(name)
+        if cached is not None and cached[0] == token:
+            return cached[1]
+        df = _read_snapshot(name, token)
+        if df is None:
+            # Typed once before writing, so the Arrow file already holds compact columns
+            fresh = apply_schema(read_sql(query), name)
+            try:
+                _write_snapshot(name, token, fresh)
+            except (OSError, pa.ArrowException) as e:
+                # Still serve the fresh frame, only the file to share is missing
+                logger.warning("Could not write the snapshot of %s: %s", name, e)
+            # Serve the memory-mapped copy so every session shares the same buffers
+            df = _read_snapshot(name, token)
+            if df is None:
+                df = fresh
+        _frames[name] = (token, df)
+    return df
+
+
+def load_table(table_name, columns=None):
+    """Load a whole table from its local snapshot, re-pulling it only when it changed."""
+    df = _load(table_name, f"SELECT * FROM {table_name}", [table_name])
+    if columns is not None:
+        return df[list(columns)]
+    # Shallow copy so callers can add or drop columns without touching the
+    # snapshot, writes to existing columns are copied on write
+    return df.copy(deep=False)
+
+
+def load_query(name, query, tables):
+    """Load the result of a query through a snapshot invalidated by the given tables."""
+    return _load(name, query, tables).copy(deep=False)
+
+
+def invalidate(table_name=None):
+    """Forget cached change tokens so the next load checks the database again."""
+    if table_name is None:
+        _tokens.clear()
+    else:
+        _tokens.pop(table_name, None)
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+# Share of the synthetic transactions kept, the rest are lost for lack of a
+# retention strategy
+RETAINED_SHARE = 0.8
+
+COLUMNS = [
+    "user_id",
+    "transaction_id",
+    "date",
+    "quarter",
+    "product_id",
+    "product_name",
+    "category",
+    "coupon_code",
+    "coupon_status",
+    "discount_percentage",
+    "quantity",
+    "actual_price",
+]
+
+
+def users_by_quarter(reference):
+    """Unique users of each quarter as one array, with per quarter offsets and counts."""
+    users = (
+        reference[["quarter", "user_id"]]
+        .drop_duplicates()
+        .sort_values(["quarter", "user_id"])
+    )
+    counts = users.groupby("quarter").size().reindex(range(1, 5), fill_value=0)
+    counts = counts.to_numpy()
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return users["user_id"].to_numpy(), offsets, counts
+
+
+def _as_dtype(values, dtype):
+    # Keep categoricals of the reference, so concatenating both years stays compact
+    if isinstance(dtype, pd.CategoricalDtype):
+        return pd.Categorical(values, dtype=dtype)
+    return values
+
+
+def synthetic_history(
+    reference, products, year=2018, scale=1.0, seed=3101, chunksize=1_000_000
+):
+    """Yield a synthetic year of transactions modelled on the reference sales.
+
+    Dates are uniform over the year, products uniform over the products sold in
+    the reference, quantities uniform up to its 90th percentile, and every
+    transaction goes to a random user who bought in the same quarter of the
+    reference. No coupons are used and only RETAINED_SHARE of the transaction
+    ids are kept. All draws are vectorised per chunk of transaction ids, so
+    len(reference) * scale rows can be generated chunk by chunk from one seed.
+
+    reference needs user_id, quarter, product_id and quantity columns, products
+    the product_id, product_name, category and actual_price columns. Raises
+    ValueError if a quarter of the reference has no users to draw from.
+    """
+    rng = np.random.default_rng(seed)
+    n_transactions = int(round(len(reference) * scale))
+    users, offsets, counts = users_by_quarter(reference)
+    # The draw below would silently index into the next quarter's users instead
+    empty = np.flatnonzero(counts == 0) + 1
+    if len(empty):
+        raise ValueError(
+            f"The reference has no users in quarter(s) {', '.join(map(str, empty))}"
+        )
+    catalogue = reference["product_id"].dropna().unique()
+    catalogue = np.asarray(catalogue.astype(object))
+    details = products.set_index(products["product_id"].astype(object))[
+        ["product_name", "category", "actual_price"]
+    ]
+    max_quantity = int(np.percentile(reference["quantity"], 90) + 1)
+    start = pd.Timestamp(f"{year}-01-01")
+    span = (pd.Timestamp(f"{year}-12-31") - start).value
+
+    for first in range(0, n_transactions, chunksize):
+        size = min(chunksize, n_transactions - first)
+        # An exact share of the ids survives, like sampling rows without replacement
+        kept = np.sort(
+            rng.choice(size, size=round(size * RETAINED_SHARE), replace=False)
+        )
+        n = len(kept)
+        dates = pd.DatetimeIndex(start.value + (span * rng.random(n)).astype(np.int64))
+        quarter = dates.quarter.to_numpy()
+        product_id = catalogue[rng.integers(len(catalogue), size=n)]
+        product = details.reindex(product_id)
+        # Index arrays into the users of each row's quarter instead of one choice per row
+        user = offsets[quarter - 1] + (rng.random(n) * counts[quarter - 1]).astype(
+            np.int64
+        )
+
+        chunk = pd.DataFrame(
+            {
+                "user_id": users[user],
+                "transaction_id": first + kept + 1,
+                "date": dates,
+                "quarter": quarter,
+                "product_id": _as_dtype(product_id, reference["product_id"].dtype),
+                "product_name": product["product_name"].to_numpy(),
+                "category": _as_dtype(
+                    product["category"].to_numpy(), products["category"].dtype
+                ),
+                "coupon_code": np.nan,
+                "coupon_status": np.nan,
+                "discount_percentage": 0.0,
+                "quantity": rng.integers(1, max_quantity, size=n),
+                "actual_price": product["actual_price"].to_numpy(),
+            }
+        )
+        for column in ["coupon_code", "coupon_status"]:
+            if column in reference:
+                chunk[column] = _as_dtype(chunk[column], reference[column].dtype)
+        yield chunk[COLUMNS]
+
+
+def total_spent(df):
+    """What each transaction cost the customer, after the discount of a used coupon."""
+    price = df["actual_price"] * df["quantity"]
+    return np.where(
+        df["coupon_status"] == "Used", price * (1 - df["discount_percentage"]), price
+    )
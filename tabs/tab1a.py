@@ -1,110 +1,39 @@
-import os
-from dotenv import load_dotenv
 import pandas as pd
-import numpy as np
-import datetime as dt
-from lifetimes import BetaGeoFitter, GammaGammaFitter
-import matplotlib.pyplot as plt
+import time
+from contextlib import contextmanager
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-import sqlalchemy
-
-# load from .env file
-current_dir = os.getcwd()
-# parent_dir = os.path.dirname(current_dir)
-parent_dir = current_dir
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-engine = sqlalchemy.create_engine(
-    f"postgresql://{user}:{postgres_password}@{host}:{postgres_port_no}/{database}"
+from tabs.snapshot import load_table
+from tabs.registry import get, invalidate, report_once
+from purchase_behaviour.model_store import (
+    CLTV_MONTHS,
+    DISCOUNT_RATE,
+    PROFIT_MARGIN,
+    fingerprint,
+    get_models,
+)
+from purchase_behaviour.expected_purchases import expected_transactions_curve
+from purchase_behaviour.purchase_simulation import purchase_bands
+from purchase_behaviour.customer_features import (
+    customer_summary,
+    fit_summary_models,
+    load_customer_totals,
+    rfm_segment_sizes,
 )
 
 
-# function to create df
-def create_df(table_name):
-    try:
-        connection = engine.connect()
-        query = f"""
-        SELECT 
-            *
-        FROM
-            {table_name} 
-        """
-
-        df = pd.read_sql(query, con=connection)
-        if table_name == "users":
-            df = df.rename(columns={"user_id": "cust_id"})
-        return df
-    except Exception as e:
-        print("An error occurred:", e)
-        connection.rollback()
-    finally:
-        connection.close()
-
-
-def create_full_table():
-    full_table = create_df("online_sales")
-    tables = {"products": "product_id", "users": "cust_id", "ratings": "product_id"}
-    for key, value in tables.items():
-        df = create_df(key)
-        full_table = pd.merge(full_table, df, on=value, how="inner")
-
-    full_table["total_price"] = np.where(
-        full_table["coupon_status"] == "Used",
-        full_table["quantity"]
-        * full_table["actual_price"]
-        * (1 - full_table["discount_percentage_x"]),
-        full_table["quantity"] * full_table["actual_price"],
-    )
-    full_table["date"] = pd.to_datetime(full_table["date"], errors="coerce")
-    return full_table
-
-
-def plot_historical_rfm():
-    df = create_full_table()
-    df["total_price"] = df["total_price"].astype(float)
-
-    # Set a dummy reference date for recency calculations
-    reference_date = pd.to_datetime("2020-01-01")
-    rfm = df.groupby("cust_id").agg(
-        {
-            "date": lambda x: (reference_date - x.max()).days,
-            "transaction_id": "count",
-            "total_price": "sum",
-        }
-    )
+@contextmanager
+def timed(timings, step):
+    """Record how long the enclosed block took under the given step name."""
+    start = time.perf_counter()
+    yield
+    timings.append({"Step": step, "Seconds": time.perf_counter() - start})
 
-    rfm.columns = ["Recency", "Frequency", "Monetary"]
-    # Rank each customer for Recency, Frequency, and Monetary
-    rfm["Recency_rank"] = pd.qcut(rfm["Recency"], 5, labels=[5, 4, 3, 2, 1])
-    rfm["Frequency_rank"] = pd.qcut(
-        rfm["Frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5]
-    )
-    rfm["Monetary_rank"] = pd.qcut(
-        rfm["Monetary"].astype(float), 5, labels=[1, 2, 3, 4, 5]
-    )  # Ensuring Monetary is float
-
-    rfm["RFM_Score"] = (
-        rfm["Recency_rank"].astype(int)
-        + rfm["Frequency_rank"].astype(int)
-        + rfm["Monetary_rank"].astype(int)
-    )
 
-    # Customer segmentation based on RFM score
-    rfm["Segment"] = pd.cut(
-        rfm["RFM_Score"],
-        bins=[2, 5, 8, 11, 15],
-        labels=["Low", "Medium", "High", "Top"],
-    )
+def plot_historical_rfm(totals):
     labels = ["Low", "Medium", "High", "Top"]
-    rfm_segment_counts = rfm["Segment"].value_counts().reindex(labels)
+    rfm_segment_counts = rfm_segment_sizes(totals)
 
     # Convert the series to a DataFrame for Plotly
     rfm_segment_counts_df = rfm_segment_counts.reset_index()
@@ -137,35 +66,23 @@ def plot_historical_rfm():
     return fig
 
 
-def plot_historical_cltv():
-    df = create_full_table()
-    # Aggregate data at the customer level
-    cltv = (
-        df.groupby("cust_id")
-        .agg(
-            {
-                "transaction_id": "nunique",  # Number of orders (Frequency)
-                "total_price": "sum",  # Total revenue (Monetary)
-                "product_id": "nunique",  # Number of unique products purchased
-                "date": "max",
-            }
-        )
-        .reset_index()
-    )
-    cltv.columns = [
-        "cust_id",
-        "total_orders",
-        "total_revenue",
-        "unique_products",
-        "last_purchase_date",
-    ]
+def plot_historical_cltv(totals):
+    # Customer level orders (Frequency), revenue (Monetary) and unique products
+    cltv = pd.DataFrame(
+        {
+            "total_orders": totals["orders"],
+            "total_revenue": totals["revenue"],
+            "unique_products": totals["unique_products"],
+            "last_purchase_date": totals["last_day"].to_numpy().astype("datetime64[D]"),
+        }
+    ).reset_index()
 
     cltv["AOV"] = cltv["total_revenue"] / cltv["total_orders"]
     cltv["purchase_frequency"] = cltv["total_orders"] / (cltv.shape[0])
     cltv["customer_value"] = cltv["purchase_frequency"] * cltv["AOV"]
     repeat_rate = cltv[cltv["total_orders"] > 1].shape[0] / cltv.shape[0]
     churn_rate = 1 - repeat_rate
-    cltv["profit_margin"] = cltv["total_revenue"] * 0.20
+    cltv["profit_margin"] = cltv["total_revenue"] * PROFIT_MARGIN
     cltv["cltv"] = cltv["customer_value"] / churn_rate * cltv["profit_margin"]
 
     # Define the fixed CLTV thresholds
@@ -206,54 +123,74 @@ def plot_historical_cltv():
     return fig
 
 
-def bg_nbd():
-    today_date = dt.datetime(2020, 1, 1)
-    sales = create_full_table()
+# weeks of expected purchases computed up front, so the inputs only slice them
+CURVE_WEEKS = 52
+# Longest horizon the week inputs accept, ten years
+MAX_WEEKS = 520
+# Monte Carlo paths behind the percentile bands of the expected transactions chart
+SIMULATIONS = 1000
 
-    cltv_prediction = sales.groupby("cust_id").agg(
-        {
-            "date": [min, max],
-            "transaction_id": "nunique",
-            "total_price": "sum",
-        }
-    )
 
-    cltv_prediction.columns = ["earliest_date", "latest_date", "frequency", "monetary"]
+def model_version(df, bgf):
+    """Fingerprint of a customer summary and the BG/NBD parameters fitted on it."""
+    params = ",".join(f"{value:.12g}" for value in bgf.params_.values)
+    return f"{fingerprint(df)}/{params}"
 
-    cltv_prediction["recency"] = (
-        cltv_prediction["latest_date"] - cltv_prediction["earliest_date"]
-    ).dt.days
-    cltv_prediction["monetary"] = (
-        cltv_prediction["monetary"] / cltv_prediction["frequency"]
-    )
-    cltv_prediction["T"] = (today_date - cltv_prediction["earliest_date"]).dt.days
 
-    # he BG/NBD model assumes that customers have already made some repeat purchases to establish a purchasing pattern.
-    # When frequency is 0, there isn’t enough data for the model to make reliable predictions about future transactions hence, remove frequency = 0
-    cltv_prediction = cltv_prediction[(cltv_prediction["frequency"] > 1)]
-    # some users have multiple transactions on only one day
-    cltv_prediction = cltv_prediction[(cltv_prediction["recency"] > 0)]
+def horizon_cached(name, build, num_weeks, version):
+    """build(weeks) cached for the longest horizon asked for so far.
 
-    cltv_prediction["T"] = cltv_prediction["T"] / 7
-    cltv_prediction["recency"] = cltv_prediction["recency"] / 7
+    Shorter horizons are sliced from it, so inputs at different horizons share
+    one entry per data and model version instead of evicting each other.
+    """
+    weeks = max(CURVE_WEEKS, num_weeks)
+    cached_weeks, value = get(name, lambda: (weeks, build(weeks)), version=version)
+    while cached_weeks < num_weeks:
+        # Only ever grows, at most to MAX_WEEKS
+        invalidate(name)
+        cached_weeks, value = get(name, lambda: (weeks, build(weeks)), version=version)
+    return value
 
-    cltv_prediction = cltv_prediction.drop(columns=["earliest_date", "latest_date"])
 
-    bgf = BetaGeoFitter(penalizer_coef=0.001)
-    bgf.fit(
-        cltv_prediction["frequency"], cltv_prediction["recency"], cltv_prediction["T"]
+def expected_purchases(df, bgf, num_weeks):
+    """Customers x weeks expected purchases and their total, cached per summary and model."""
+    return horizon_cached(
+        "expected_purchases",
+        lambda weeks: expected_transactions_curve(bgf, df, weeks),
+        num_weeks,
+        model_version(df, bgf),
     )
 
-    return bgf, cltv_prediction
+
+def simulated_purchases(df, bgf, num_weeks):
+    """5th, 50th and 95th percentile of simulated cumulative purchases per week."""
+    bands = horizon_cached(
+        "simulated_purchases",
+        lambda weeks: purchase_bands(bgf, df, weeks, simulations=SIMULATIONS),
+        num_weeks,
+        model_version(df, bgf),
+    )
+    return bands[:, :num_weeks]
+
+
+def load_customer_scores():
+    """Scores written by purchase_behaviour/batch_scoring.py, None if it has not run."""
+    try:
+        # Tables scored before the intervals were added get empty bounds
+        return load_table("customer_scores").reindex(
+            columns=["cust_id", "clv", "clv_lower", "clv_upper", "scored_at"]
+        )
+    except Exception as e:
+        report_once("Customer scores are not available:", e)
+        return None
 
 
 # plot top n customers in num_weeks
 # n, num_weeks is dynamic
 def top_customers(n, num_weeks, df, bgf):
+    matrix, _ = expected_purchases(df, bgf, num_weeks)
     top_customers_num_weeks = (
-        bgf.conditional_expected_number_of_purchases_up_to_time(
-            num_weeks, df["frequency"], df["recency"], df["T"]  # number of weeks
-        )
+        pd.Series(matrix[:, num_weeks - 1], index=df.index)  # number of weeks
         .sort_values(ascending=False)
         .head(n)
     )
@@ -291,21 +228,38 @@ def plot_top_customers(n, num_weeks, df, bgf):
 # number of transactions expected by the company in num_weeks
 # num_weeks is dynamic
 def expected_num_transactions(num_weeks, df, bgf):
-    res = []
-    weeks = []
-    for week in range(num_weeks):
-        num_transactions_in_week = bgf.predict(
-            week + 1, df["frequency"], df["recency"], df["T"]
-        ).sum()
-        res.append(num_transactions_in_week)
-        weeks.append(week)
+    _, curve = expected_purchases(df, bgf, num_weeks)
+    weeks = list(range(num_weeks))
+    res = curve[:num_weeks].tolist()
     return weeks, res
 
 
 def plot_expected_num_transactions(num_weeks, df, bgf):
     weeks, expected_transactions = expected_num_transactions(num_weeks, df, bgf)
+    lower, median, upper = simulated_purchases(df, bgf, num_weeks)
 
     fig = go.Figure()
+    # 90% band of the simulated totals, drawn first so the lines stay on top
+    fig.add_trace(
+        go.Scatter(
+            x=weeks + weeks[::-1],
+            y=upper.tolist() + lower.tolist()[::-1],
+            fill="toself",
+            fillcolor="rgba(255, 0, 0, 0.15)",
+            line=dict(color="rgba(255, 0, 0, 0)"),
+            hoverinfo="skip",
+            name="Simulated 5th-95th Percentile",
+        )
+    )
+    fig.add_trace(
+        go.Scatter(
+            x=weeks,
+            y=median,
+            mode="lines",
+            line=dict(color="red", dash="dot"),
+            name="Simulated Median",
+        )
+    )
     fig.add_trace(
         go.Scatter(
             x=weeks,
@@ -330,11 +284,11 @@ def plot_expected_num_transactions(num_weeks, df, bgf):
     return fig
 
 
-# gamma-gamma model
-def gamma_gamma(df):
-    ggf = GammaGammaFitter(penalizer_coef=0.01)
-    ggf.fit(df["frequency"], df["monetary"])
-    return ggf
+def fit_models(df):
+    # Parameters are persisted with a fingerprint of the summary and only refitted,
+    # in the background, once new transactions change it
+    bgf, ggf = get_models("customer_models", df, fit_summary_models)
+    return bgf, ggf
 
 
 def cltv(df, bgf, ggf):
@@ -348,9 +302,9 @@ def cltv(df, bgf, ggf):
         df["recency"],
         df["T"],
         df["monetary"],
-        time=3,  # 3 months, how many months account do you want?
+        time=CLTV_MONTHS,  # how many months account do you want?
         freq="W",  # frequency information of T
-        discount_rate=0.01,
+        discount_rate=DISCOUNT_RATE,
     )
     cltv = cltv.reset_index()
 
@@ -367,12 +321,30 @@ def bin_cltv(df, labels, bins):
 
 
 def plot_vip(df, n, bgf, ggf):
-    df = cltv(df, bgf, ggf)
+    return plot_top_vip(cltv(df, bgf, ggf), n)
+
 
+# df needs cust_id and clv columns, e.g. the customer_scores table
+def plot_top_vip(df, n, intervals=None):
     top_vip_customers = (
         df[["cust_id", "clv"]].sort_values(by="clv", ascending=False).head(n)
     )
 
+    # Optional error bars from the bootstrap intervals of the same scoring run,
+    # indexed by cust_id
+    error_bars = {}
+    if intervals is not None:
+        top_vip_customers = top_vip_customers.merge(
+            intervals, left_on="cust_id", right_index=True, how="left"
+        )
+        top_vip_customers["error_plus"] = (
+            top_vip_customers["clv_upper"] - top_vip_customers["clv"]
+        ).clip(lower=0)
+        top_vip_customers["error_minus"] = (
+            top_vip_customers["clv"] - top_vip_customers["clv_lower"]
+        ).clip(lower=0)
+        error_bars = {"error_y": "error_plus", "error_y_minus": "error_minus"}
+
     fig = px.bar(
         top_vip_customers,
         x="cust_id",
@@ -381,6 +353,7 @@ def plot_vip(df, n, bgf, ggf):
         labels={"cust_id": "User ID", "clv": "Predicted CLTV"},
         color="clv",
         color_continuous_scale="Viridis",
+        **error_bars,
     ).update_yaxes(categoryorder="total descending")
 
     # Customize layout
@@ -393,12 +366,78 @@ def plot_vip(df, n, bgf, ggf):
     return fig
 
 
+# sections with inputs are fragments, so changing an input only reruns its chart
+@st.fragment
+def display_top_customers(df, bgf):
+    section = st.container()
+    top_num_customers = section.number_input(
+        "Enter the number of customers:", step=1, min_value=1, value=10
+    )
+    top_num_weeks = section.number_input(
+        "Enter the number of weeks:", step=1, min_value=1, max_value=MAX_WEEKS
+    )
+
+    if top_num_customers > 0 and top_num_weeks > 0:
+        section.plotly_chart(
+            plot_top_customers(top_num_customers, top_num_weeks, df, bgf)
+        )
+
+
+@st.fragment
+def display_expected_num_transactions(df, bgf):
+    section = st.container()
+    expected_num_weeks = section.number_input(
+        "Enter the number of weeks:",
+        step=1,
+        min_value=1,
+        max_value=MAX_WEEKS,
+        value=4,
+    )
+
+    if expected_num_weeks > 0:
+        section.plotly_chart(
+            plot_expected_num_transactions(expected_num_weeks, df, bgf)
+        )
+
+
+@st.fragment
+def display_vip(df, bgf, ggf):
+    section = st.container()
+    n_vip = section.number_input("Enter the number of customers:", step=1, value=10)
+    show_intervals = section.checkbox("Show 90% bootstrap intervals")
+
+    if n_vip > 0:
+        intervals = None
+        scores = load_customer_scores()
+        if scores is not None and scores["clv"].notna().any():
+            if show_intervals and scores["clv_lower"].notna().any():
+                intervals = scores.set_index("cust_id")[["clv_lower", "clv_upper"]]
+            section.plotly_chart(plot_top_vip(scores, n_vip, intervals))
+            section.caption(
+                f"Precomputed by the batch scoring job on {scores['scored_at'].max()}"
+            )
+        else:
+            section.plotly_chart(plot_vip(df, n_vip, bgf, ggf))
+        if show_intervals and intervals is None:
+            section.caption(
+                "Intervals are computed offline with the CLTV scores, run "
+                "`python purchase_behaviour/batch_scoring.py --bootstrap 200`"
+            )
+
+
 # streamlit outline
 def display_tab1a(tab1):
     """Display content for tab1a"""
 
-    bgf, df = bg_nbd()
-    ggf = gamma_gamma(df)
+    # Charts and models are computed once per data version and shared by every
+    # session, the timings show the load and compute cost of each of them
+    timings = []
+    with timed(timings, "Customer totals"):
+        totals, version = load_customer_totals()
+    with timed(timings, "Customer summary"):
+        df = customer_summary(totals)
+    with timed(timings, "Fit BG/NBD and Gamma-Gamma"):
+        bgf, ggf = fit_models(df)
 
     tab1.title("Customer Segmentation and VIP Prediction")
     tab1.write(
@@ -419,7 +458,11 @@ def display_tab1a(tab1):
     )
     tab1.write("Segments: Low (2-5), Medium (6-8), High (9-11), Top (12-15)")
 
-    tab1.plotly_chart(plot_historical_rfm())
+    with timed(timings, "Historical RFM chart"):
+        rfm_chart = get(
+            "historical_rfm_chart", lambda: plot_historical_rfm(totals), version=version
+        )
+    tab1.plotly_chart(rfm_chart)
 
     # CLTV Prediction Plot
     tab1.header("Historical Customer Lifetime Value (CLTV)")
@@ -430,31 +473,30 @@ def display_tab1a(tab1):
     tab1.write("Average Order Value: Total revenue divided by the number of orders.")
     tab1.write("Purchase Frequency: Total orders divided by total customers.")
     tab1.write("Churn Rate: Ratio of customers with no repeat orders.")
-    tab1.write("Profit Margin: Set to 20%, based on Amazon seller average margins.")
+    tab1.write(
+        f"Profit Margin: Set to {PROFIT_MARGIN:.0%}, based on Amazon seller average margins."
+    )
 
-    tab1.plotly_chart(plot_historical_cltv())
+    with timed(timings, "Historical CLTV chart"):
+        cltv_chart = get(
+            "historical_cltv_chart",
+            lambda: plot_historical_cltv(totals),
+            version=version,
+        )
+    tab1.plotly_chart(cltv_chart)
 
     # Top N Customers' Expected Purchases in X Weeks
     tab1.header("Predicted Highest Purchasing Customers in Future Weeks")
     tab1.write(
         "The BG/NBD model is a probabilistic model used to predict a customer’s future purchase behavior based on their past transactional data."
     )
-    top_num_customers = tab1.number_input(
-        "Enter the number of customers:", step=1, min_value=1, value=10
-    )
-    top_num_weeks = tab1.number_input("Enter the number of weeks:", step=1, min_value=1)
-
-    if top_num_customers > 0 and top_num_weeks > 0:
-        tab1.plotly_chart(plot_top_customers(top_num_customers, top_num_weeks, df, bgf))
+    with tab1:
+        display_top_customers(df, bgf)
 
     # Expected Number of Total Purchases in X Weeks
     tab1.header("Predicted Number of Purchases in Future Weeks")
-    expected_num_weeks = tab1.number_input(
-        "Enter the number of weeks:", step=1, min_value=1, value=4
-    )
-
-    if expected_num_weeks > 0:
-        tab1.plotly_chart(plot_expected_num_transactions(expected_num_weeks, df, bgf))
+    with tab1:
+        display_expected_num_transactions(df, bgf)
 
     # Top n VIPs Prediction
     tab1.header("VIP Customers Prediction")
@@ -464,7 +506,8 @@ def display_tab1a(tab1):
     tab1.write(
         "Customer Lifetime Value (CLTV): By multiplying the frequency of future transactions (from the BG/NBD model) with the expected transaction value (from the Gamma-Gamma model), we can predict each customer’s lifetime value."
     )
-    n_vip = tab1.number_input("Enter the number of customers:", step=1, value=10)
+    with tab1:
+        display_vip(df, bgf, ggf)
 
-    if n_vip > 0:
-        tab1.plotly_chart(plot_vip(df, n_vip, bgf, ggf))
+    with tab1.expander("Load and compute times"):
+        st.dataframe(pd.DataFrame(timings), hide_index=True)
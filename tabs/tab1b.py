@@ -1,49 +1,30 @@
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from dotenv import load_dotenv
-import os
-import psycopg2
-
-# Load environment variables
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
+from tabs.snapshot import load_table, load_query
+from tabs.registry import dataset
 
 
+@dataset(
+    "demand_forecast",
+    tables=["products", "online_sales"],
+    files=["demand_forecast/forecast.csv"],
+)
 def load_data():
     """Load and preprocess actual and forecast data."""
-    with get_db_connection() as conn:
-        print("Connected to database")
-        # Get products table
-        products = pd.read_sql_query("SELECT * FROM products", conn)
-
-        # Get actual sales data
-        actual_data = pd.read_sql_query(
-            """
-                                        SELECT date, product_id, SUM(quantity) AS sales
-                                        FROM online_sales 
-                                        GROUP BY date, product_id
-                                        ORDER BY product_id, date""",
-            conn,
-        )
+    # Get products table
+    products = load_table("products")
+
+    # Get actual sales data
+    actual_data = load_query(
+        "actual_sales",
+        """
+                                    SELECT date, product_id, SUM(quantity) AS sales
+                                    FROM online_sales 
+                                    GROUP BY date, product_id
+                                    ORDER BY product_id, date""",
+        tables=["online_sales"],
+    )
     forecast_data = pd.read_csv("demand_forecast/forecast.csv")
     return actual_data, forecast_data, products
 
@@ -101,7 +82,7 @@ def display_product_details(tab, product_details):
 def display_tab1(tab1, actual_data, forecast_data, products):
     """Display content for tab1."""
     # Extract the first part of the category before '|'
-    products["category"] = products["category"].apply(lambda x: x.split("|")[0])
+    products["category"] = products["category"].astype(str).str.split("|").str[0]
 
     # Top level filters for product from product details
     # Get the products that exist in both actual and products data
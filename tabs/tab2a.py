@@ -2,49 +2,27 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
-from dotenv import load_dotenv
-import os
-import psycopg2
+from tabs.snapshot import load_table
+from tabs.registry import dataset, data_version, get
+from tabs.churn_engine import PERIODS, churn_metrics, cohort_matrices
+from tabs.synthetic_sales import synthetic_history, total_spent
 import numpy as np
 
-# Load environment variables
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
-
 
+@dataset("churn_sales", tables=["products", "online_sales"])
 def load_data_jj():
     """Load and preprocess online_sales data."""
-    with get_db_connection() as conn:
-        print("Connected to database")
-        # Get products table
-        products_df = pd.read_sql_query("SELECT * FROM products", conn)
-        products_df.drop(
-            ["about_product", "discounted_price", "discount_percentage"],
-            axis=1,
-            inplace=True,
-        )
+    # Get products table
+    products_df = load_table("products")
+    products_df.drop(
+        ["about_product", "discounted_price", "discount_percentage"],
+        axis=1,
+        inplace=True,
+    )
 
-        # Get online_sales data
-        sales_df = pd.read_sql_query("SELECT * FROM online_sales", conn)
-        sales_df.drop(["delivery_charges"], axis=1, inplace=True)
+    # Get online_sales data
+    sales_df = load_table("online_sales")
+    sales_df.drop(["delivery_charges"], axis=1, inplace=True)
 
     df_2019 = pd.merge(sales_df, products_df, on="product_id", how="left")
     # Reorder columns
@@ -68,163 +46,43 @@ def load_data_jj():
     df_2019["date"] = pd.to_datetime(df_2019["date"])
     position = df_2019.columns.get_loc("date") + 1
     df_2019.insert(loc=position, column="quarter", value=df_2019["date"].dt.quarter)
-    # Generating synthetic data for 2018
-
-    # Set seed for reproducibility
-    np.random.seed(3101)
-
-    # Number of synthetic transactions for 2018
-    n_transactions = len(df_2019)
-
-    # Generate synthetic transaction IDs (unique)
-    transaction_ids = np.arange(1, n_transactions + 1)
-
-    # Generate random dates in 2018
-    start_date = pd.to_datetime("2018-01-01")
-    end_date = pd.to_datetime("2018-12-31")
-    transaction_dates = start_date + (end_date - start_date) * np.random.rand(
-        n_transactions
-    )
-
-    # Generate synthetic product_ids sampled from the 2019 data
-    product_ids = np.random.choice(df_2019["product_id"].unique(), size=n_transactions)
-
-    # Generate synthetic quantities
-    quantities = np.random.randint(
-        1, np.percentile(df_2019["quantity"], 90) + 1, size=n_transactions
-    )
-
-    # Create the synthetic 2018 dataset
-    df_2018 = pd.DataFrame(
-        {
-            "transaction_id": transaction_ids,
-            "date": transaction_dates,
-            "product_id": product_ids,
-            "quantity": quantities,
-        }
-    )
-
-    # Left join with the products table
-    df_2018 = pd.merge(df_2018, products_df, on="product_id", how="left")
-    # Reorder columns
-    df_2018 = df_2018[
-        [
-            "transaction_id",
-            "date",
-            "product_id",
-            "product_name",
-            "category",
-            "quantity",
-            "actual_price",
-        ]
-    ]
-
-    # Add quarter column
-    df_2018.insert(
-        loc=df_2018.columns.get_loc("date") + 1,
-        column="quarter",
-        value=df_2018["date"].dt.quarter,
-    )
-
-    # Add empty columns to simulate no coupon strategy is used
-
-    df_2018.insert(
-        loc=df_2018.columns.get_loc("category") + 1, column="coupon_code", value=np.nan
-    )
-    df_2018.insert(
-        loc=df_2018.columns.get_loc("coupon_code") + 1,
-        column="coupon_status",
-        value=np.nan,
-    )
-    df_2018.insert(
-        loc=df_2018.columns.get_loc("coupon_status") + 1,
-        column="discount_percentage",
-        value=0,
-    )
-
-    # Generate synthetic user_ids based on 2019 data
-
-    # Create a dictionary with unique user_ids for each quarter in 2019
-
-    unique_users_per_quarter_2019 = (
-        df_2019.groupby("quarter")["user_id"].unique().to_dict()
-    )
-
-    # Create a function to assign similar user ids which appears in each quarter in 2019 to each quarter in 2018.
-    def assign_user_ids(row):
-        quarter = row["quarter"]
-        unique_users = unique_users_per_quarter_2019.get(quarter, [])
-        return np.random.choice(unique_users, size=1)[0]
-
-    # Assign user ids
-    df_2018.insert(
-        loc=0, column="user_id", value=df_2018.apply(assign_user_ids, axis=1)
-    )
-
-    # Randomly remove 20% of rows to simulate poorer performance due to no retention strategy
-
-    df_2018 = df_2018.sample(frac=0.8, random_state=42)
-    df_2018 = df_2018.reset_index(drop=True)
+    # Generate a synthetic 2018 baseline from the 2019 customers and products,
+    # see tabs/synthetic_sales.py
+    df_2018 = pd.concat(synthetic_history(df_2019, products_df), ignore_index=True)
     # Combine 2018 and 2019 dataframe into a single dataframe
     df = pd.concat([df_2018, df_2019], ignore_index=True)
     # Create a total_spent column to indicate how much a customer spends each transaction
-    df["total_spent"] = df.apply(
-        lambda row: (
-            row["actual_price"] * row["quantity"] * (1 - row["discount_percentage"])
-            if row["coupon_status"] == "Used"
-            else row["actual_price"] * row["quantity"]
-        ),
-        axis=1,
-    )
+    df["total_spent"] = total_spent(df)
     # Create a column to show year and quarter
     df["year_quarter"] = df["date"].dt.to_period("Q")
     return df
 
 
-# Define a function to calculate churn rate
-
-
-def calculate_churn_rate(df):
-    # Group unique users into the respective year and quarter
-    customers_per_quarter = df.groupby("year_quarter")["user_id"].unique().reset_index()
-    churn_rates = []
-
-    for i in range(1, len(customers_per_quarter)):
-        current_customers = set(customers_per_quarter["user_id"].iloc[i])
-        previous_customers = set(customers_per_quarter["user_id"].iloc[i - 1])
-
-        # Taking a set difference to identify customers present in the previous quarter but not in the current quarter
-        churned_customers = previous_customers - current_customers
-
-        # Churn rate: percentage of previous customers who churned
-        churn_rate = len(churned_customers) / len(previous_customers)
-
-        churn_rates.append(
-            {
-                "year_quarter": customers_per_quarter["year_quarter"].iloc[i],
-                "churn_rate": churn_rate,
-            }
-        )
-    churn_rate_df = pd.DataFrame(churn_rates)
-    churn_rate_df["year_quarter"] = churn_rate_df["year_quarter"].astype(str)
-    return churn_rate_df
+# Churn per period from packed customer activity bitmaps, see tabs/churn_engine.py
+def calculate_churn_rate(df, freq="Q"):
+    return get(
+        f"churn_metrics_{freq}",
+        lambda: churn_metrics(df["user_id"], df["date"], freq),
+        version=data_version(tables=["products", "online_sales"]),
+    )
 
 
 def display_tab2a(tab2, df):
-    churn_rate_df = calculate_churn_rate(df)
+    period = tab2.selectbox("Period", list(PERIODS), key="churn_period")
+    churn_rate_df = calculate_churn_rate(df, PERIODS[period])
     # Create and display line chart
     fig = px.line(
         churn_rate_df,
-        x="year_quarter",
+        x="period",
         y="churn_rate",
         markers=True,
-        title="Churn Rate By Quarter",
+        title=f"Churn Rate By {period.removesuffix('ly')}",
     )
     # Customize the line style and hover information
     fig.update_traces(
         line=dict(width=2, color="royalblue"),
         marker=dict(size=8),
-        hovertemplate="Year-Quarter: %{x}<br>Churn Rate: %{y:.1%}",  # Custom hover template
+        hovertemplate="Period: %{x}<br>Churn Rate: %{y:.1%}",  # Custom hover template
         hoverlabel=dict(
             bgcolor="#1fe0fb",  # Background color of the hover box
             font_size=14,  # Font size of the hover text
@@ -234,24 +92,76 @@ def display_tab2a(tab2, df):
 
     # Customize the layout
     fig.update_layout(
-        xaxis_title="Year and Quarter",  # Custom x-axis label
+        xaxis_title="Period",  # Custom x-axis label
         yaxis_title="Churn Rate (%)",  # Custom y-axis label
         yaxis_tickformat=".1%",  # Format y-axis as percentage
         hovermode="x unified",  # Unified hover mode
     )
     tab2.plotly_chart(fig)
     tab2.write(
-        "Churn rate is defined quarterly. For example, a user that makes a transaction in the previous quarter but not in the next quarter will be marked as churned."
+        "Churn rate is defined per period. For example, a user that makes a transaction in the previous quarter but not in the next quarter will be marked as churned."
+    )
+    with tab2.expander("Retention and reactivation"):
+        st.write(
+            "Retained users bought in both periods, reactivated users bought in the period and an earlier one but not the previous one."
+        )
+        st.dataframe(
+            churn_rate_df,
+            hide_index=True,
+            column_config={
+                column: st.column_config.NumberColumn(format="%.3f")
+                for column in ["churn_rate", "retention_rate", "reactivation_rate"]
+            },
+        )
+
+
+def quarterly_cube(df):
+    """Transactions, revenue and quantity per year, quarter and coupon status.
+
+    A few dozen rows the coupon and revenue charts read instead of every
+    transaction. Transactions without a coupon count as not used.
+    """
+    # Filled on a copy of the column, the shared frame is left untouched
+    coupon_status = df["coupon_status"].astype("category")
+    if "Not Used" not in coupon_status.cat.categories:
+        coupon_status = coupon_status.cat.add_categories("Not Used")
+    cube = (
+        df.groupby(
+            [
+                df["date"].dt.year.rename("year"),
+                df["quarter"],
+                coupon_status.fillna("Not Used"),
+            ],
+            observed=True,
+        )
+        .agg(
+            transactions=("transaction_id", "size"),
+            revenue=("total_spent", "sum"),
+            quantity=("quantity", "sum"),
+        )
+        .reset_index()
+    )
+    cube["year_quarter"] = cube["year"].astype(str) + "Q" + cube["quarter"].astype(str)
+    return cube
+
+
+def load_quarterly_cube(df):
+    # Built once per data version and shared read-only by every session
+    return get(
+        "quarterly_cube",
+        lambda: quarterly_cube(df),
+        version=data_version(tables=["products", "online_sales"]),
     )
 
 
 def display_tab2b(tab2, df):
-    df["coupon_status"] = df["coupon_status"].fillna("Not Used")
+    cube = load_quarterly_cube(df)
     # Count coupons used or not used by year and quarter
     coupon_counts = (
-        df.groupby(["year_quarter", "coupon_status"]).size().reset_index(name="count")
+        cube.groupby(["year_quarter", "coupon_status"], observed=True)["transactions"]
+        .sum()
+        .reset_index(name="count")
     )
-    coupon_counts["year_quarter"] = coupon_counts["year_quarter"].astype(str)
 
     # Calculate the total transactions per year_quarter
     total_transactions = (
@@ -312,17 +222,12 @@ def display_tab2b(tab2, df):
 def display_tab2c(tab2, df):
 
     # Filter data for 2018 and 2019
+    cube = load_quarterly_cube(df).rename(columns={"revenue": "total_spent"})
     revenue_2018 = (
-        df[df["date"].dt.year == 2018]
-        .groupby("quarter")["total_spent"]
-        .sum()
-        .reset_index()
+        cube[cube["year"] == 2018].groupby("quarter")["total_spent"].sum().reset_index()
     )
     revenue_2019 = (
-        df[df["date"].dt.year == 2019]
-        .groupby("quarter")["total_spent"]
-        .sum()
-        .reset_index()
+        cube[cube["year"] == 2019].groupby("quarter")["total_spent"].sum().reset_index()
     )
 
     # Convert total_spent to millions
@@ -381,3 +286,46 @@ def display_tab2c(tab2, df):
 
     # Display the plot in Streamlit
     tab2.plotly_chart(fig)
+
+
+def calculate_cohorts(df, freq="Q"):
+    return get(
+        f"cohort_matrices_{freq}",
+        lambda: cohort_matrices(df["user_id"], df["date"], df["total_spent"], freq),
+        version=data_version(tables=["products", "online_sales"]),
+    )
+
+
+def display_tab2d(tab2, df):
+    tab2.header("Cohort Retention")
+    left, right = tab2.columns(2)
+    period = left.selectbox("Cohort period", list(PERIODS), key="cohort_period")
+    measure = right.selectbox(
+        "Measure", ["Retention", "Revenue per customer"], key="cohort_measure"
+    )
+    retention, revenue, sizes = calculate_cohorts(df, PERIODS[period])
+
+    if measure == "Retention":
+        matrix, text, colour_label = retention, ".0%", "Retained"
+    else:
+        matrix = revenue.div(sizes, axis=0)
+        text, colour_label = ",.0f", "Revenue per customer"
+
+    # Heatmap of cohorts (rows) by periods since their first purchase (columns)
+    fig = px.imshow(
+        matrix,
+        text_auto=text if len(matrix.columns) <= 24 else False,
+        color_continuous_scale="Blues",
+        aspect="auto",
+        labels={
+            "x": f"{period.removesuffix('ly')}s Since First Purchase",
+            "y": "Cohort",
+            "color": colour_label,
+        },
+        title=f"{measure} by {period.removesuffix('ly')} of First Purchase",
+    )
+    fig.update_yaxes(type="category")
+    tab2.plotly_chart(fig)
+    tab2.write(
+        "Each row is a cohort of users whose first transaction fell in that period, and each column counts the periods since then. Column 0 is always 100% retention."
+    )
@@ -2,8 +2,10 @@ import pandas as pd
 import streamlit as st
 import math
 from dotenv import load_dotenv
+from tabs.registry import dataset
 
 
+@dataset("pricing_forecast", files=["pricing-strategies/forecast_with_ped.csv"])
 def load_data_tab2():
     return pd.read_csv("pricing-strategies/forecast_with_ped.csv")
 
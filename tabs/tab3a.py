@@ -1,40 +1,59 @@
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from dotenv import load_dotenv
-import os
-import psycopg2
-import networkx as nx
-from mlxtend.frequent_patterns import apriori, association_rules
 import plotly.graph_objects as go
+from tabs.schema import apply_schema
+from tabs.registry import dataset, data_version, get
+from tabs.channel_cube import CHART_TYPES, build_channel_cube, chart_data, mean_by
 
-# Load environment variables
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
+MARKETING_CHANNELS_CSV = "marketing_channels/marketing_channels.csv"
 
 
+@dataset("marketing_channels", files=[MARKETING_CHANNELS_CSV])
 def load_data_wy():
     """Load data"""
-    sales_data = pd.read_csv("marketing_channels/marketing_channels.csv")
-    return sales_data
+    sales_data = pd.read_csv(MARKETING_CHANNELS_CSV)
+    return apply_schema(sales_data, "marketing_channels")
+
+
+def market_basket(sales_data, min_support):
+    """Basket matrix and association rules, mined once per data version and support."""
+    from mlxtend.frequent_patterns import apriori, association_rules
+
+    version = data_version(files=[MARKETING_CHANNELS_CSV])
+
+    def build_basket():
+        basket = (
+            sales_data.groupby(["transaction_id", "product_id"], observed=True)[
+                "quantity"
+            ]
+            .sum()
+            .unstack()
+            .reset_index()
+            .fillna(0)
+            .set_index("transaction_id")
+        )
+        return basket.applymap(lambda x: 1 if x > 0 else 0)
+
+    basket = get("market_basket", build_basket, version=version)
+
+    def mine_rules():
+        frequent_itemsets = apriori(basket, min_support=min_support, use_colnames=True)
+        return association_rules(
+            frequent_itemsets, metric="confidence", min_threshold=0.1
+        )
+
+    rules = get(f"market_basket_rules_{min_support:.3f}", mine_rules, version=version)
+    return basket, rules
+
+
+def load_channel_cube(sales_data):
+    # Every chart below reads these aggregates instead of regrouping the sales
+    return get(
+        "marketing_channel_cube",
+        lambda: build_channel_cube(sales_data),
+        version=data_version(files=[MARKETING_CHANNELS_CSV]),
+    )
 
 
 def display_tab3a(tab3, sales_data):
@@ -55,7 +74,8 @@ def display_tab3a(tab3, sales_data):
             roi_column = "ROI_adjusted"
 
         # Unique marketing channels for the filter
-        marketing_channels = sales_data["marketing_channel"].unique()
+        by_channel = load_channel_cube(sales_data)[0]
+        marketing_channels = by_channel["marketing_channel"].tolist()
         selected_channels = st.multiselect(
             "Select Marketing Channels to Display",
             options=marketing_channels,
@@ -63,14 +83,13 @@ def display_tab3a(tab3, sales_data):
             key="channel_selector_tab3a",  # Unique key to avoid duplicate ID error
         )
 
-        filtered_data = sales_data[
-            sales_data["marketing_channel"].isin(selected_channels)
+        filtered_data = by_channel[
+            by_channel["marketing_channel"].isin(selected_channels)
         ]
-        avg_roi_by_channel = (
-            filtered_data.groupby("marketing_channel")[roi_column]
-            .mean()
-            .reset_index()
-            .sort_values(by=roi_column, ascending=False)  # Sort in descending order
+        avg_roi_by_channel = mean_by(filtered_data, "marketing_channel", roi_column)
+        # Sort in descending order
+        avg_roi_by_channel = avg_roi_by_channel.sort_values(
+            by=roi_column, ascending=False
         )
 
         fig = px.bar(
@@ -97,12 +116,12 @@ def display_tab3b(tab3, sales_data):
         # Section Title
         st.subheader("Seasonal ROI Trend Over Time by Marketing Channel")
 
-        # Ensure the 'date' column is in datetime format
-        sales_data["date"] = pd.to_datetime(sales_data["date"], errors="coerce")
+        # Daily totals per channel, dates are parsed by the schema on load
+        by_day_channel = load_channel_cube(sales_data)[1]
 
         # Convert min_date and max_date to datetime format for st.slider compatibility
-        min_date = sales_data["date"].min().to_pydatetime()
-        max_date = sales_data["date"].max().to_pydatetime()
+        min_date = by_day_channel["date"].min().to_pydatetime()
+        max_date = by_day_channel["date"].max().to_pydatetime()
         date_range = st.slider(
             "Select Date Range",
             min_value=min_date,
@@ -111,13 +130,13 @@ def display_tab3b(tab3, sales_data):
         )
 
         # Filter data based on the selected date range
-        filtered_data = sales_data[
-            (sales_data["date"] >= date_range[0])
-            & (sales_data["date"] <= date_range[1])
+        filtered_data = by_day_channel[
+            (by_day_channel["date"] >= date_range[0])
+            & (by_day_channel["date"] <= date_range[1])
         ]
 
         # Multiselect for marketing channels with a unique key
-        marketing_channels = filtered_data["marketing_channel"].unique()
+        marketing_channels = filtered_data["marketing_channel"].unique().tolist()
         selected_channels = st.multiselect(
             "Select Marketing Channels to Display",
             options=marketing_channels,
@@ -131,13 +150,11 @@ def display_tab3b(tab3, sales_data):
         ]
 
         # Group by month and marketing channel, calculating the mean seasonal ROI
-        filtered_data["year_month"] = filtered_data["date"].dt.to_period("M")
-        seasonality_data = (
-            filtered_data.groupby(["year_month", "marketing_channel"])[
-                "ROI_seasonal_adjusted"
-            ]
-            .mean()
-            .reset_index()
+        filtered_data = filtered_data.assign(
+            year_month=filtered_data["date"].dt.to_period("M")
+        )
+        seasonality_data = mean_by(
+            filtered_data, ["year_month", "marketing_channel"], "ROI_seasonal_adjusted"
         )
 
         # Explicitly convert 'year_month' back to a standard datetime format
@@ -190,74 +207,12 @@ def display_tab3c(tab3, sales_data):
         # Dropdown selection for chart type
         chart_type = st.selectbox(
             "Select Chart Type",
-            options=[
-                "Total quantity sold",
-                "Average quantity sold per transaction",
-                "Total revenue",
-                "Average revenue per transaction",
-                "Total transactions",
-                "Repeat purchase rate",
-                "Product variety per transaction",
-                "New customer rate",
-                "Average adjusted ROI",
-            ],
+            options=list(CHART_TYPES),
         )
 
-        # Initialize variables based on chart type
-        if chart_type == "Total quantity sold":
-            data = sales_data.groupby("coupon_status")["quantity"].sum().reset_index()
-            y_axis = "quantity"
-            title = "Total Quantity Sold"
-        elif chart_type == "Average quantity sold per transaction":
-            data = sales_data.groupby("coupon_status")["quantity"].mean().reset_index()
-            y_axis = "quantity"
-            title = "Average Quantity Sold per Transaction"
-        elif chart_type == "Total revenue":
-            data = sales_data.groupby("coupon_status")["revenue"].sum().reset_index()
-            y_axis = "revenue"
-            title = "Total Revenue"
-        elif chart_type == "Average revenue per transaction":
-            data = sales_data.groupby("coupon_status")["revenue"].mean().reset_index()
-            y_axis = "revenue"
-            title = "Average Revenue per Transaction"
-        elif chart_type == "Total transactions":
-            data = (
-                sales_data.groupby("coupon_status")["transaction_id"]
-                .nunique()
-                .reset_index()
-            )
-            y_axis = "transaction_id"
-            title = "Total Transactions"
-        elif chart_type == "Repeat purchase rate":
-            data = (
-                sales_data.groupby("coupon_status")["Is_First_Purchase"]
-                .apply(lambda x: 1 - x.mean())
-                .reset_index()
-            )
-            y_axis = "Is_First_Purchase"
-            title = "Repeat Purchase Rate"
-        elif chart_type == "Product variety per transaction":
-            data = (
-                sales_data.groupby("coupon_status")["product_id"]
-                .nunique()
-                .reset_index()
-            )
-            y_axis = "product_id"
-            title = "Product Variety per Transaction"
-        elif chart_type == "New customer rate":
-            data = (
-                sales_data.groupby("coupon_status")["Is_First_Purchase"]
-                .mean()
-                .reset_index()
-            )
-            y_axis = "Is_First_Purchase"
-            title = "New Customer Rate"
-        elif chart_type == "Average adjusted ROI":
-            data = (
-                sales_data.groupby("coupon_status")["ROI_adjusted"].mean().reset_index()
-            )
-            y_axis = "ROI_adjusted"
-            title = "Average Adjusted ROI"
+        # Read from the per coupon status summary of the cube
+        by_status = load_channel_cube(sales_data)[2]
+        data, y_axis, title = chart_data(by_status, chart_type, ["coupon_status"])
 
         fig = px.bar(
             data,
@@ -278,97 +233,15 @@ def display_tab3d(tab3, sales_data):
         # Dropdown selection for chart type
         chart_type = st.selectbox(
             "Select Chart Type",
-            options=[
-                "Total quantity sold",
-                "Average quantity sold per transaction",
-                "Total revenue",
-                "Average revenue per transaction",
-                "Total transactions",
-                "Repeat purchase rate",
-                "Product variety per transaction",
-                "New customer rate",
-                "Average adjusted ROI",
-            ],
+            options=list(CHART_TYPES),
             key="chart_type_selector_tab3d",  # Unique key to avoid duplicate ID error
         )
 
-        # Initialize variables based on chart type
-        if chart_type == "Total quantity sold":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["quantity"]
-                .sum()
-                .reset_index()
-            )
-            y_axis = "quantity"
-            title = "Total Quantity Sold"
-        elif chart_type == "Average quantity sold per transaction":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["quantity"]
-                .mean()
-                .reset_index()
-            )
-            y_axis = "quantity"
-            title = "Average Quantity Sold per Transaction "
-        elif chart_type == "Total revenue":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["revenue"]
-                .sum()
-                .reset_index()
-            )
-            y_axis = "revenue"
-            title = "Total Revenue"
-        elif chart_type == "Average revenue per transaction":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["revenue"]
-                .mean()
-                .reset_index()
-            )
-            y_axis = "revenue"
-            title = "Average Revenue per Transaction"
-        elif chart_type == "Total transactions":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["transaction_id"]
-                .nunique()
-                .reset_index()
-            )
-            y_axis = "transaction_id"
-            title = "Total Transactions"
-        elif chart_type == "Repeat purchase rate":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])[
-                    "Is_First_Purchase"
-                ]
-                .apply(lambda x: 1 - x.mean())
-                .reset_index()
-            )
-            y_axis = "Is_First_Purchase"
-            title = "Repeat Purchase Rate"
-        elif chart_type == "Product variety per transaction":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["product_id"]
-                .nunique()
-                .reset_index()
-            )
-            y_axis = "product_id"
-            title = "Product Variety per Transaction"
-        elif chart_type == "New customer rate":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])[
-                    "Is_First_Purchase"
-                ]
-                .mean()
-                .reset_index()
-            )
-            y_axis = "Is_First_Purchase"
-            title = "New Customer Rate"
-        elif chart_type == "Average adjusted ROI":
-            data = (
-                sales_data.groupby(["coupon_code", "coupon_status"])["ROI_adjusted"]
-                .mean()
-                .reset_index()
-            )
-            y_axis = "ROI_adjusted"
-            title = "Average adjusted ROI"
+        # Read from the per coupon code and status summary of the cube
+        by_code_status = load_channel_cube(sales_data)[3]
+        data, y_axis, title = chart_data(
+            by_code_status, chart_type, ["coupon_code", "coupon_status"]
+        )
 
         fig = px.bar(
             data,
@@ -411,20 +284,13 @@ def display_tab3d(tab3, sales_data):
 
 
 def display_tab3e(tab3, sales_data):
+    # Only needed for the market basket chart
+    import networkx as nx
+
     with tab3:
         # Section Title
         st.subheader("Market Basket Analysis of Promotional Campaign Products")
 
-        basket = (
-            sales_data.groupby(["transaction_id", "product_id"])["quantity"]
-            .sum()
-            .unstack()
-            .reset_index()
-            .fillna(0)
-            .set_index("transaction_id")
-        )
-        basket = basket.applymap(lambda x: 1 if x > 0 else 0)
-
         # Slider for min_support in Streamlit
         min_support = st.slider(
             "Select minimum support threshold",
@@ -435,11 +301,9 @@ def display_tab3e(tab3, sales_data):
             format="%f",
         )
 
-        # Generate frequent itemsets and association rules based on min_support
-        frequent_itemsets = apriori(basket, min_support=min_support, use_colnames=True)
-        rules = association_rules(
-            frequent_itemsets, metric="confidence", min_threshold=0.1
-        )
+        # Frequent itemsets and association rules based on min_support, reused
+        # across reruns and sessions until the data changes
+        basket, rules = market_basket(sales_data, min_support)
 
         # List to store rows of data
         association_data = []
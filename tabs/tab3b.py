@@ -1,45 +1,22 @@
 import pandas as pd
 import plotly.express as px
 import streamlit as st
-from dotenv import load_dotenv
-import os
-import psycopg2
-from sqlalchemy import create_engine
-
-# Load environment variables
-current_dir = os.getcwd()
-parent_dir = os.path.dirname(current_dir)
-load_dotenv(f"{parent_dir}/.env")
-
-postgres_password = os.getenv("POSTGRES_PASSWORD")
-postgres_port_no = os.getenv("POSTGRES_PORT")
-host = os.getenv("POSTGRES_HOST")
-database = os.getenv("POSTGRES_DB")
-user = os.getenv("POSTGRES_USER")
-
-
-def get_db_connection():
-    """Get a database connection."""
-    return psycopg2.connect(
-        host=host,
-        database=database,
-        user=user,
-        password=postgres_password,
-        port=postgres_port_no,
-    )
+from tabs.snapshot import load_table, load_query
+from tabs.registry import dataset
 
 
+@dataset("supply_chain", tables=["shipping_status", "shipping_history", "products"])
 def load_data_tab3():
     """Load the data for supply chain efficiency analysis."""
-    with get_db_connection() as conn:
-        # Load the required tables for analysis
-        shipping_history_df = pd.read_sql_query(
-            "SELECT s.product_id, s.shipping_id, s.fulfilment, s.ship_service_level, s.estimated_delivery_date, s.fulfilled_by, h.status, h.update_date FROM shipping_status AS s RIGHT JOIN shipping_history AS h ON s.shipping_id = h.shipping_id",
-            conn,
-        )
-        products_df = pd.read_sql_query(
-            "SELECT product_id, product_name, origin_area FROM products", conn
-        )
+    # Load the required tables for analysis
+    shipping_history_df = load_query(
+        "shipping_history_status",
+        "SELECT s.product_id, s.shipping_id, s.fulfilment, s.ship_service_level, s.estimated_delivery_date, s.fulfilled_by, h.status, h.update_date FROM shipping_status AS s RIGHT JOIN shipping_history AS h ON s.shipping_id = h.shipping_id",
+        tables=["shipping_status", "shipping_history"],
+    )
+    products_df = load_table(
+        "products", columns=["product_id", "product_name", "origin_area"]
+    )
     return shipping_history_df, products_df
 
 
@@ -48,9 +25,9 @@ def preprocess_data(shipping_history_df):
 
     # Combine fulfilment and ship_service_level to create a new condition
     shipping_history_df["fulfilment_service_level"] = (
-        shipping_history_df["fulfilment"]
+        shipping_history_df["fulfilment"].astype(object)
         + " + "
-        + shipping_history_df["ship_service_level"]
+        + shipping_history_df["ship_service_level"].astype(object)
     )
 
     successful_orders = shipping_history_df.groupby("shipping_id").filter(
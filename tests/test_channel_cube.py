@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tabs.channel_cube import CHART_TYPES, build_channel_cube, chart_data, mean_by
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    n = 2_000
+
+    def pick(values):
+        return rng.choice(np.array(values, dtype=object), n)
+
+    df = pd.DataFrame(
+        {
+            "date": pd.Timestamp("2023-01-01")
+            + pd.to_timedelta(rng.integers(0, 60, n), unit="D"),
+            "marketing_channel": pick(["Email", "Social", "Search", None]),
+            "coupon_code": pick(["ELEC10", "OFF20", None]),
+            "coupon_status": pick(["Used", "Clicked", "Not Used"]),
+            "transaction_id": rng.integers(0, 800, n),
+            "product_id": pick(["P1", "P2", "P3", "P4", "P5"]),
+            "quantity": rng.integers(1, 5, n).astype(float),
+            "revenue": rng.random(n) * 100,
+            "Is_First_Purchase": rng.integers(0, 2, n).astype(float),
+        }
+    )
+    for column in ["ROI", "ROI_adjusted", "ROI_seasonal_adjusted"]:
+        df[column] = np.where(rng.random(n) < 0.1, np.nan, rng.normal(1, 0.5, n))
+    df.loc[rng.random(n) < 0.05, "quantity"] = np.nan
+    return df
+
+
+def test_rollups_match_groupbys(sales):
+    by_channel, by_date_channel, _, _ = build_channel_cube(sales)
+
+    expected = sales.groupby("marketing_channel", sort=False)["ROI"].mean()
+    assert list(by_channel["marketing_channel"]) == list(
+        sales["marketing_channel"].dropna().unique()
+    )
+    got = mean_by(by_channel, "marketing_channel", "ROI").set_index(
+        "marketing_channel"
+    )["ROI"]
+    pd.testing.assert_series_equal(got, expected.sort_index(), check_names=False)
+
+    keys = ["date", "marketing_channel"]
+    expected = sales.groupby(keys)["ROI_seasonal_adjusted"].mean()
+    got = mean_by(by_date_channel, keys, "ROI_seasonal_adjusted").set_index(keys)
+    pd.testing.assert_series_equal(
+        got["ROI_seasonal_adjusted"], expected, check_names=False
+    )
+
+
+def expected_chart(sales, keys, chart_type):
+    grouped = sales.groupby(keys)
+    return {
+        "Total quantity sold": grouped["quantity"].sum(),
+        "Average quantity sold per transaction": grouped["quantity"].mean(),
+        "Total revenue": grouped["revenue"].sum(),
+        "Average revenue per transaction": grouped["revenue"].mean(),
+        "Total transactions": grouped["transaction_id"].nunique(),
+        "Repeat purchase rate": 1 - grouped["Is_First_Purchase"].mean(),
+        "Product variety per transaction": grouped["product_id"].nunique(),
+        "New customer rate": grouped["Is_First_Purchase"].mean(),
+        "Average adjusted ROI": grouped["ROI_adjusted"].mean(),
+    }[chart_type]
+
+
+@pytest.mark.parametrize("chart_type", list(CHART_TYPES))
+def test_charts_match_groupbys(sales, chart_type):
+    _, _, by_status, by_code = build_channel_cube(sales)
+    for summary, keys in (
+        (by_status, ["coupon_status"]),
+        (by_code, ["coupon_code", "coupon_status"]),
+    ):
+        data, y_axis, _ = chart_data(summary, chart_type, keys)
+        got = data.set_index(keys)[y_axis]
+        expected = expected_chart(sales, keys, chart_type)
+        pd.testing.assert_series_equal(
+            got.astype(float), expected.astype(float), check_names=False
+        )
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tabs.churn_engine import churn_metrics, cohort_matrices
+
+
+def purchases(seed, n=3_000):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2021-01-01") + pd.to_timedelta(
+        rng.integers(0, 700, n), unit="D"
+    )
+    users = rng.integers(0, 400, n).astype(str)
+    return pd.Series(users), pd.Series(dates)
+
+
+def buyers_by_period(users, dates, freq):
+    periods = pd.PeriodIndex(dates, freq=freq)
+    frame = pd.DataFrame({"user": users, "period": periods})
+    index = pd.period_range(periods.min(), periods.max(), freq=freq)
+    groups = frame.groupby("period")["user"].agg(set)
+    return index, [groups.get(period, set()) for period in index]
+
+
+@pytest.mark.parametrize("freq", ["Q", "M", "W"])
+@pytest.mark.parametrize("seed", range(3))
+def test_churn_matches_set_differences(seed, freq):
+    users, dates = purchases(seed)
+    metrics = churn_metrics(users, dates, freq)
+    index, buyers = buyers_by_period(users, dates, freq)
+
+    assert list(metrics["period"]) == list(index[1:].astype(str))
+    seen = set()
+    for row, (previous, current) in zip(
+        metrics.itertuples(), zip(buyers[:-1], buyers[1:])
+    ):
+        seen |= previous
+        assert row.active == len(current)
+        assert row.retained == len(previous & current)
+        assert row.churned == len(previous - current)
+        assert row.reactivated == len((current - previous) & seen)
+        assert row.new == len(current - seen)
+
+
+def test_missing_users_and_dates_are_dropped():
+    users = pd.Series(["a", None, "b", "a"])
+    dates = pd.Series(pd.to_datetime(["2022-01-05", "2022-04-01", None, "2022-04-02"]))
+    metrics = churn_metrics(users, dates)
+    assert metrics[["active", "retained", "churned"]].values.tolist() == [[1, 1, 0]]
+
+
+def test_cohorts_match_first_purchase_periods():
+    users, dates = purchases(7)
+    revenue = pd.Series(np.random.default_rng(7).random(len(users)) * 100)
+    retention, revenue_matrix, sizes = cohort_matrices(users, dates, revenue)
+
+    frame = pd.DataFrame(
+        {"user": users, "period": pd.PeriodIndex(dates, freq="Q"), "rev": revenue}
+    )
+    frame["cohort"] = frame.groupby("user")["period"].transform("min")
+    frame["age"] = (frame["period"] - frame["cohort"]).apply(lambda d: d.n)
+    last = frame["period"].max()
+    for (cohort, age), cell in frame.groupby(["cohort", "age"]):
+        label = str(cohort)
+        size = frame.loc[frame["cohort"] == cohort, "user"].nunique()
+        assert sizes[label] == size
+        assert retention.loc[label, age] == pytest.approx(cell["user"].nunique() / size)
+        assert revenue_matrix.loc[label, age] == pytest.approx(cell["rev"].sum())
+    # Ages past the last period have not been observed yet
+    for label in retention.index:
+        unobserved = (last - pd.Period(label, freq="Q")).n + 1
+        assert retention.loc[label].iloc[unobserved:].isna().all()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lifetimes import BetaGeoFitter
+
+from purchase_behaviour.expected_purchases import (
+    expected_purchases_matrix,
+    expected_transactions_curve,
+)
+
+
+def fitter(r=0.24, alpha=4.4, a=0.79, b=2.4):
+    bgf = BetaGeoFitter()
+    bgf.params_ = pd.Series({"r": r, "alpha": alpha, "a": a, "b": b})
+    return bgf
+
+
+def customers(seed, n=300):
+    rng = np.random.default_rng(seed)
+    T = rng.uniform(1, 78, n)
+    recency = T * rng.random(n)
+    frequency = rng.poisson(3, n).astype(float)
+    # lifetimes gives customers without repeat purchases a recency of zero
+    recency[frequency == 0] = 0
+    return pd.DataFrame({"frequency": frequency, "recency": recency, "T": T})
+
+
+@pytest.mark.parametrize("params", [{}, {"r": 1.2, "alpha": 0.8, "a": 3.5, "b": 6.0}])
+def test_matrix_matches_lifetimes(params):
+    bgf = fitter(**params)
+    df = customers(0)
+    horizons = [1, 4, 13, 52]
+    matrix = expected_purchases_matrix(
+        bgf, df["frequency"], df["recency"], df["T"], horizons
+    )
+    assert matrix.shape == (len(df), len(horizons))
+    for column, t in enumerate(horizons):
+        expected = bgf.conditional_expected_number_of_purchases_up_to_time(
+            t, df["frequency"], df["recency"], df["T"]
+        )
+        np.testing.assert_allclose(matrix[:, column], expected, rtol=1e-9)
+
+
+def test_curve_sums_customers_per_week():
+    bgf = fitter()
+    df = customers(1)
+    matrix, totals = expected_transactions_curve(bgf, df, 10)
+    assert matrix.shape == (len(df), 10)
+    np.testing.assert_allclose(totals, matrix.sum(axis=0))
+    expected = bgf.conditional_expected_number_of_purchases_up_to_time(
+        10, df["frequency"], df["recency"], df["T"]
+    ).sum()
+    assert totals[-1] == pytest.approx(expected)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from purchase_behaviour.quantile_sketch import QuantileSketch, RFM_QUANTILES
+
+
+def sketch_of(values, chunks=1, k=200):
+    sketch = QuantileSketch(k=k, seed=0)
+    for i, chunk in enumerate(np.array_split(values, chunks)):
+        sketch.merge(QuantileSketch(k=k, seed=i + 1).update(chunk))
+    return sketch
+
+
+@pytest.mark.parametrize("chunks", [1, 7])
+@pytest.mark.parametrize("seed", range(5))
+def test_quantiles_within_error_bound(seed, chunks):
+    values = np.random.default_rng(seed).lognormal(3, 1.5, 100_000)
+    sketch = sketch_of(values, chunks)
+    bound = sketch.error_bound()
+    ordered = np.sort(values)
+    for q, edge in zip(RFM_QUANTILES, sketch.quantiles(RFM_QUANTILES)):
+        below = np.searchsorted(ordered, edge, side="left") / len(values)
+        upto = np.searchsorted(ordered, edge, side="right") / len(values)
+        assert below - bound <= q <= upto + bound
+
+
+@pytest.mark.parametrize("chunks", [1, 7])
+def test_ranks_match_qcut_within_error_bound(chunks):
+    values = np.random.default_rng(42).random(50_000)
+    sketch = sketch_of(values, chunks)
+    edges = sketch.quantiles(RFM_QUANTILES)
+    ranks = np.searchsorted(edges, values, side="left") + 1
+    exact = pd.qcut(values, len(RFM_QUANTILES) + 1, labels=False) + 1
+    # Each edge misplaces at most its own rank error worth of customers
+    assert (ranks != exact).mean() <= len(RFM_QUANTILES) * sketch.error_bound()
+
+
+def test_small_input_is_exact():
+    values = np.random.default_rng(0).random(150)
+    sketch = sketch_of(values)
+    assert sketch.error_bound() == 0
+    ranks = np.searchsorted(sketch.quantiles(RFM_QUANTILES), values) + 1
+    np.testing.assert_array_equal(ranks, pd.qcut(values, 5, labels=False) + 1)
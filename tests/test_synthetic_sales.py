@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tabs.synthetic_sales import COLUMNS, RETAINED_SHARE, synthetic_history
+
+
+@pytest.fixture
+def reference():
+    rng = np.random.default_rng(0)
+    n = 4_000
+    return pd.DataFrame(
+        {
+            "user_id": rng.integers(0, 500, n),
+            "quarter": rng.integers(1, 5, n),
+            "product_id": rng.choice(["P1", "P2", "P3"], n),
+            "quantity": rng.integers(1, 10, n),
+        }
+    )
+
+
+@pytest.fixture
+def products():
+    return pd.DataFrame(
+        {
+            "product_id": ["P1", "P2", "P3", "P4"],
+            "product_name": ["Pen", "Mug", "Cap", "Bag"],
+            "category": ["Office", "Home", "Apparel", "Apparel"],
+            "actual_price": [2.0, 8.0, 15.0, 30.0],
+        }
+    )
+
+
+def generate(reference, products, **kwargs):
+    return pd.concat(
+        synthetic_history(reference, products, chunksize=1_000, **kwargs),
+        ignore_index=True,
+    )
+
+
+def test_same_seed_same_history(reference, products):
+    first = generate(reference, products)
+    pd.testing.assert_frame_equal(first, generate(reference, products))
+    assert not first.equals(generate(reference, products, seed=1))
+
+
+def test_history_follows_reference(reference, products):
+    history = generate(reference, products, scale=1.5)
+    assert list(history.columns) == COLUMNS
+    n_transactions = round(len(reference) * 1.5)
+    assert len(history) == pytest.approx(n_transactions * RETAINED_SHARE, abs=5)
+    assert history["transaction_id"].is_unique
+    assert history["transaction_id"].between(1, n_transactions).all()
+    assert (history["date"].dt.year == 2018).all()
+    assert (history["quarter"] == history["date"].dt.quarter).all()
+
+    # Every user bought in the same quarter of the reference
+    bought = set(zip(reference["quarter"], reference["user_id"]))
+    assert set(zip(history["quarter"], history["user_id"])) <= bought
+    assert set(history["product_id"]) <= set(reference["product_id"])
+    prices = products.set_index("product_id")["actual_price"]
+    assert (history["actual_price"] == history["product_id"].map(prices)).all()
+    assert history["quantity"].between(1, reference["quantity"].quantile(0.9)).all()
+
+
+def test_quarter_without_users_raises(reference, products):
+    with pytest.raises(ValueError, match="quarter"):
+        next(synthetic_history(reference[reference["quarter"] != 3], products))